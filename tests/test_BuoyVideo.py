@@ -7,7 +7,7 @@ test_simple.py - Tests registration of a single video against a background
 import cv2
 import context
 import os
-from vision.vision_tools import VisionTools
+from vision.vision_tools import VisionTools, buoyTracker
 from vision.cameras.camera_video_feed import videoFeedCamera
 
 if __name__ == '__main__':
@@ -28,10 +28,13 @@ if __name__ == '__main__':
     joeCamera = videoFeedCamera(debug=fullFilePath)
 
     tools = VisionTools()
-
+    # keeps the number of each buoy the same from frame to frame
+    boxes = buoyTracker()
 
     while(True):
-        image = joeCamera.getFrame()
+        success, image = joeCamera.getFrame()
+        if not success:
+            break
 
         cv2.imshow('image', image)
 
@@ -40,7 +43,9 @@ if __name__ == '__main__':
         dim = (640, int(image.shape[0] * r))
         image = cv2.resize(image, dim, interpolation=cv2.INTER_AREA)
 
-        final = tools.BuoyBoxes(image)
+        # foreground is found once per frame and can be shared with findObjWColor
+        foreground = tools.updateForeground(image)
+        final = tools.BuoyBoxes(image, boxes, foreground)
 
 
         cv2.imshow('image', final)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+'''
+test_cameraManager.py - drives a forward and a downward camera (two videos)
+plus a still image camera at the same time and shows time aligned frame sets.
+'''
+#import all necessary packages and utilities
+import cv2
+import context
+import os
+from vision.cameras.camera_video_feed import videoFeedCamera
+from vision.cameras.camera_img_feed import imgFeedCamera
+from vision.cameras.camera_manager import CameraManager
+
+if __name__ == '__main__':
+    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+    print("Camera Manager Test: captures two videos and an image ")
+    print("     camera concurrently and displays frame sets whose ")
+    print("     timestamps are within the sync tolerance. ")
+    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+
+    #define relative path of test files
+    path = os.getcwd()
+    #in case of windows users, switched backslashes with fwd slashes
+    pathFwd = '/'.join(path.split('\\'))
+    pathFwd = pathFwd + '/test_files/'
+
+    forwardCamera = videoFeedCamera(name="forward", debug=pathFwd + 'clip_GOPR0157.MP4')
+    downwardCamera = videoFeedCamera(name="downward", debug=pathFwd + 'output.avi')
+    stillCamera = imgFeedCamera(name="still", debug=pathFwd + 'oball_screenshot.png')
+
+    #capture at 30 fps per camera, frames of a set must be within 20 ms of each other
+    manager = CameraManager([forwardCamera, downwardCamera, stillCamera], tolerance=0.02, rate=30)
+    manager.start()
+
+    while True:
+        frameSet = manager.getFrameSet(timeout=1.0)
+        if frameSet is None:
+            if manager.isFinished():
+                break
+            print("no aligned frame set within 1 s")
+            continue
+        times = [timestamp for timestamp, frame in frameSet.values()]
+        print("frame set spread: %.1f ms" % ((max(times) - min(times))*1000))
+        for name, (timestamp, frame) in frameSet.items():
+            cv2.imshow(name, frame)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+    manager.stop()
+    for name in ['forward', 'downward', 'still']:
+        print(name, "average capture latency: %.1f ms" % (manager.getLatency(name)*1000))
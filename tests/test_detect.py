@@ -55,8 +55,7 @@ if __name__ == '__main__':
 
     #detect object based on mask defined by userMask
     obj_cent, locx, locy, max_val, final_obj, small_ROI, detect = tools.detectObject(environment, mask_env, userMask, threshold)
-    color = tools.avgColor(small_ROI)
-    rgb = color[0, 0]
+    rgb = tools.avgColorValue(small_ROI)
 
     #draw a bounding box around the object, define the bounding box, calculate the percentage of the
     #frame covered by the bounding box, and define a region of interest (ROI) around the boxed object
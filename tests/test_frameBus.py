@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+'''
+test_frameBus.py - publishes a video onto a shared memory frame bus and reads
+it from several consumer processes at the same time, without copying frames.
+'''
+#import all necessary packages and utilities
+import context
+import os
+import time
+import multiprocessing
+from vision.cameras.camera_video_feed import videoFeedCamera
+from vision.cameras.frame_bus import FramePublisher, FrameBusReader
+
+
+##
+# @brief consumer process: attaches to the bus and reads frames as NumPy views
+# @param busName name of the frame bus
+# @param consumer name printed with the results
+def consume(busName, consumer):
+    reader = FrameBusReader(busName)
+    seq = -1
+    count = 0
+    while True:
+        seq, timestamp, frame = reader.read(after=seq, timeout=2.0)
+        if seq is None:
+            break
+        #work on the view directly, it is only valid until the writer wraps around the ring
+        brightness = frame.mean()
+        if not reader.isValid(seq):
+            print(consumer, "frame", seq, "was overwritten while being used")
+        count += 1
+        print(consumer, "frame", seq, "latency %.1f ms" % ((time.time() - timestamp)*1000), "mean %.1f" % brightness)
+    print(consumer, "read", count, "frames")
+    reader.close()
+
+
+if __name__ == '__main__':
+    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+    print("Frame Bus Test: publishes a video onto a shared memory ")
+    print("     frame bus and reads it from three consumer processes ")
+    print("     (detection, line following, buoy tracking).")
+    print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+
+    #define relative path to test file
+    path = os.getcwd()
+    #in case of windows users, switched backslashes with fwd slashes
+    pathFwd = '/'.join(path.split('\\'))
+    pathFwd = pathFwd + '/test_files/'
+    filename = 'clip_GOPR0157.MP4'
+    fullFilePath = pathFwd + filename
+
+    busName = 'joe_frames'
+    joeCamera = videoFeedCamera(debug=fullFilePath)
+    publisher = FramePublisher(joeCamera, busName, slots=8)
+
+    consumers = [multiprocessing.Process(target=consume, args=(busName, name))
+                 for name in ['detection', 'line following', 'buoy tracking']]
+    for consumer in consumers:
+        consumer.start()
+
+    #publish at the camera frame rate so the consumers keep up
+    publisher.run(fps=30)
+    for consumer in consumers:
+        consumer.join()
+    publisher.stop()
@@ -31,8 +31,14 @@ if __name__ == '__main__':
 
     # Setup a loop to capture a frame from the video feed
     while True:
-        image = joeCamera.getFrame()
-        final = tools.lineDet(image)
-        cv2.imshow("Filtered line", final)
+        success, image = joeCamera.getFrame()
+        if not success:
+            break
+        #follow the line, only searching the whole frame when it is lost
+        line = tools.trackLine(image)
+        if line is not None:
+            #print what the controllers would steer on
+            print("angle: %.1f deg  offset: %.1f px  confidence: %.2f" % line, tools.lineTracker.getMode())
+        cv2.imshow("Line", image)
         if cv2.waitKey(100) & 0xFF == ord('q'):
             break
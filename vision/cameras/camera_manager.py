@@ -0,0 +1,144 @@
+# camera_manager.py - Drives several cameras at once (e.g. the forward camera
+#                     for buoys and the downward camera for the path line).
+#                     Every camera is captured on its own worker thread so a
+#                     slow camera can not stall the others, each frame is
+#                     timestamped, and time aligned sets of frames are handed out.
+import time
+import threading
+from collections import deque
+
+
+class CameraManager:
+    ##
+    # @param cameras List of Camera subclass instances, their names must be unique
+    # @param tolerance Largest spread (seconds) between the timestamps of the frames of one set
+    # @param history Number of recent frames kept per camera to align sets with
+    # @param rate Maximum capture rate per camera (frames per second), None captures as fast as
+    #        the camera delivers. Useful for imgFeedCamera, which never runs out of frames
+    def __init__(self, cameras, tolerance=0.02, history=8, rate=None):
+        self.cameras = {}
+        for camera in cameras:
+            if camera.getName() in self.cameras:
+                raise ValueError("Camera name '%s' is used twice" % camera.getName())
+            self.cameras[camera.getName()] = camera
+        self.tolerance = tolerance
+        self.rate = rate
+        # camera name -> deque of (timestamp, frame), newest last
+        self.frames = {name: deque(maxlen=history) for name in self.cameras}
+        # camera name -> [number of frames, total seconds spent in getFrame]
+        self.latency = {name: [0, 0.0] for name in self.cameras}
+        self.finished = set()
+        self.cond = threading.Condition()
+        self.running = False
+        self.threads = []
+        # reference time of the last set handed out
+        self.lastSetTime = None
+
+    ##
+    # @brief starts one capture thread per camera
+    def start(self):
+        self.running = True
+        for name in self.cameras:
+            thread = threading.Thread(target=self.capture, args=(name,), name=name + " capture", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    ##
+    # @brief body of a capture thread: reads frames from one camera until it runs out or stop is called
+    # @param name Name of the camera
+    def capture(self, name):
+        camera = self.cameras[name]
+        while self.running:
+            start = time.time()
+            result = camera.getFrame()
+            timestamp = time.time()
+            # video cameras return (success, frame), image cameras just the frame
+            if isinstance(result, tuple):
+                success, frame = result
+            else:
+                success, frame = result is not None, result
+            if not success:
+                break
+            with self.cond:
+                self.frames[name].append((timestamp, frame))
+                self.latency[name][0] += 1
+                self.latency[name][1] += timestamp - start
+                self.cond.notify_all()
+            if self.rate is not None:
+                time.sleep(max(0, 1.0/self.rate - (time.time() - start)))
+        with self.cond:
+            self.finished.add(name)
+            self.cond.notify_all()
+
+    ##
+    # @brief finds the best aligned set among the frames already captured
+    # @return reference time and {name: (timestamp, frame)}, or None if the newest and oldest frame of the set are
+    #         further apart than tolerance
+    def alignedSet(self, tolerance):
+        if not all(self.frames.values()):
+            return None
+        # the slowest camera's newest frame sets the time, the others pick their closest frame to it
+        ref = min(frames[-1][0] for frames in self.frames.values())
+        if self.lastSetTime is not None and ref <= self.lastSetTime:
+            return None
+        frameSet = {}
+        for name, frames in self.frames.items():
+            frameSet[name] = min(frames, key=lambda item: abs(item[0] - ref))
+        # frames on both sides of ref can each be close to it and still be too far from each other
+        times = [timestamp for timestamp, frame in frameSet.values()]
+        if max(times) - min(times) > tolerance:
+            return None
+        return ref, frameSet
+
+    ##
+    # @brief waits for a new set of frames, one per camera, captured within the sync tolerance
+    # @param tolerance Largest spread (seconds) between the frames of the set, defaults to the one given at construction
+    # @param timeout Seconds to wait, None waits until a set is found or a camera runs out of frames
+    # @return frameSet {camera name: (timestamp, frame)}, None if no aligned set came up in time
+    def getFrameSet(self, tolerance=None, timeout=None):
+        if tolerance is None:
+            tolerance = self.tolerance
+        with self.cond:
+            found = None
+
+            def ready():
+                nonlocal found
+                found = self.alignedSet(tolerance)
+                return found is not None or bool(self.finished) or not self.running
+            self.cond.wait_for(ready, timeout)
+            if found is None:
+                return None
+            self.lastSetTime = found[0]
+            return found[1]
+
+    ##
+    # @brief newest frame of a single camera, without waiting for the others
+    # @param name Name of the camera
+    # @return (timestamp, frame), None if the camera has not delivered a frame yet
+    def getLatest(self, name):
+        with self.cond:
+            if not self.frames[name]:
+                return None
+            return self.frames[name][-1]
+
+    ##
+    # @param name Name of the camera
+    # @return Average seconds the camera took per getFrame call
+    def getLatency(self, name):
+        count, total = self.latency[name]
+        return total/count if count else 0.0
+
+    ##
+    # @return True once any camera has run out of frames
+    def isFinished(self):
+        return bool(self.finished)
+
+    ##
+    # @brief stops the capture threads
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
@@ -1,23 +1,101 @@
 # camera_video_feed.py - This is a 'test' camera that will take in a video feed
 #                      and act as a camera
 from .camera import Camera
+from .frame_queue import FrameQueue
+import threading
 import cv2
 
 
 class videoFeedCamera(Camera):
     ##
     # @param fileLocation The absolute file path to the video
+    # @param prefetch Number of frames decoded ahead on a background thread. 0 decodes in getFrame
+    # @param prefetch_mode 'drop' always hands out the freshest frame (live camera),
+    #        'lossless' hands out every frame in order (file replay)
+    # @param size (width, height) of the frames handed out. A height of None keeps the aspect ratio
+    # @param stride Hand out frames 0, stride, 2*stride, ...; the frames in between are grabbed but never converted
+    # @param grayscale Hand out single channel gray frames
+    # @param hw_accel Ask the backend for hardware accelerated decoding, if this OpenCV build supports it
+    # @param interpolation cv2.resize interpolation used when the backend can not deliver the size itself
     # @post An openCV connection to the video file
-    def __init__(self, connType=99, name="Image Feed", debug=None):
+    def __init__(self, connType=99, name="Image Feed", debug=None, prefetch=0, prefetch_mode='lossless',
+                 size=None, stride=1, grayscale=False, hw_accel=False, interpolation=cv2.INTER_LINEAR):
         # use the IPaddress as the video file location
         Camera.__init__(self, connType, name, debug)
-        self.cap = cv2.VideoCapture(debug)
+        if hw_accel and hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+            self.cap = cv2.VideoCapture(debug, cv2.CAP_ANY,
+                                        [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        else:
+            self.cap = cv2.VideoCapture(debug)
+        self.size = size
+        self.stride = max(1, int(stride))
+        # frames to grab before the next read, the stride - 1 skipped after every frame handed out
+        self.skip = 0
+        self.grayscale = grayscale
+        self.interpolation = interpolation
+        if size is not None and size[1] is not None:
+            # live cameras can deliver the size directly, video files ignore this
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        # decode and gray conversion buffers, reused for every frame (never handed out)
+        self.raw = None
+        self.gray = None
+        self.queue = None
+        self.thread = None
+        if prefetch > 0:
+            self.queue = FrameQueue(prefetch, prefetch_mode)
+            self.thread = threading.Thread(target=self.capture, name=name + " capture", daemon=True)
+            self.thread.start()
         print("Initialized camera.", self.__str__())
 
+    ##
+    # @brief body of the capture thread: decodes frames into the queue until the feed ends or release is called
+    def capture(self):
+        while not self.queue.isClosed():
+            success, frame = self.readFrame()
+            if not success:
+                break
+            self.queue.put(frame)
+        self.queue.close()
+
+    ##
+    # @brief reads the next frame to hand out and puts it in the requested format
+    # @return success False once the video has no more frames
+    # @return frame New array with the requested size and color format
+    def readFrame(self):
+        # the frames skipped after the last read are grabbed now, not right after it, so that frame was not held back
+        for i in range(self.skip):
+            if not self.cap.grab():
+                return False, None
+        self.skip = self.stride - 1
+        if self.size is None and not self.grayscale:
+            return self.cap.read()
+        success, raw = self.cap.read(self.raw)
+        if not success:
+            return False, None
+        self.raw = raw
+        if self.size is not None and self.size[1] is None:
+            # fix the height from the aspect ratio of the first frame
+            self.size = (self.size[0], int(raw.shape[0]*self.size[0]/raw.shape[1]))
+        resize = self.size is not None and (raw.shape[1], raw.shape[0]) != tuple(self.size)
+        if self.grayscale:
+            # convert before resizing so the resize only touches one channel
+            if not resize:
+                return True, cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY)
+            self.gray = cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY, dst=self.gray)
+            raw = self.gray
+        if not resize:
+            return True, raw.copy()
+        return True, cv2.resize(raw, tuple(self.size), interpolation=self.interpolation)
+
     ##
     # @return Processed frame that was captured from the camera
     def getFrame(self):
-        success, frame = self.cap.read()
+        if self.queue is not None:
+            frame = self.queue.get()
+            success = frame is not None
+        else:
+            success, frame = self.readFrame()
         if (success):
             #cv2.imshow('ting',frame)
             #print("shape: ", frame.shape)
@@ -26,3 +104,26 @@ class videoFeedCamera(Camera):
             return success, frame
         else:
             print('failure')
+            return success, frame
+
+    ##
+    # @return Number of decoded frames waiting in the prefetch queue
+    def getQueueDepth(self):
+        if self.queue is None:
+            return 0
+        return self.queue.getDepth()
+
+    ##
+    # @return Number of decoded frames that were dropped without being handed out
+    def getDroppedFrames(self):
+        if self.queue is None:
+            return 0
+        return self.queue.getDropped()
+
+    ##
+    # @brief stops the capture thread (if any) and closes the video
+    def release(self):
+        if self.queue is not None:
+            self.queue.close()
+            self.thread.join()
+        self.cap.release()
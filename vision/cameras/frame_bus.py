@@ -0,0 +1,230 @@
+# frame_bus.py - Shared memory frame ring that lets one camera feed several
+#                processes (detection, line following, buoy tracking, ...).
+#                The writer copies each frame into the ring once; readers get
+#                NumPy views straight into the shared memory, with a sequence
+#                number and a timestamp, without copying.
+import sys
+import time
+import threading
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+
+# written into the header once the rest of it is filled in, so a reader never sizes the bus from a blank header
+busMagic = 0x4652414d45425553   # 'FRAMEBUS'
+
+
+class FrameBusWriter:
+    # layout of the shared memory: header, slot table, then the frames
+    headerType = np.dtype([('slots', np.int64),
+                           ('rows', np.int64),
+                           ('cols', np.int64),
+                           ('channels', np.int64),   # 0 for single channel (2D) frames
+                           ('latest', np.int64),
+                           ('dtype', 'S8'),
+                           ('magic', np.int64)])     # busMagic once the header is ready
+    slotType = np.dtype([('seq', np.int64),
+                         ('timestamp', np.float64)])
+
+    ##
+    # @param name Name of the bus, readers attach with the same name
+    # @param shape Shape of the frames that will be published
+    # @param dtype Type of the frame pixels
+    # @param slots Number of frames kept in the ring. A reader holding a view has
+    #        slots - 1 frames of time before the writer reuses its slot
+    def __init__(self, name, shape, dtype=np.uint8, slots=4):
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        frameBytes = int(np.prod(shape))*dtype.itemsize
+        size = self.headerType.itemsize + slots*self.slotType.itemsize + slots*frameBytes
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        self.header, self.table, self.frames = mapBus(self.shm, slots, shape, dtype)
+        self.table['seq'] = -1
+        self.header['slots'] = slots
+        self.header['rows'], self.header['cols'] = shape[:2]
+        self.header['channels'] = shape[2] if len(shape) > 2 else 0
+        self.header['dtype'] = dtype.str.encode()
+        # nothing published yet
+        self.header['latest'] = -1
+        # last, readers wait for it
+        self.header['magic'] = busMagic
+
+    ##
+    # @brief copies a frame into the next slot of the ring
+    # @param frame Frame with the shape given at construction
+    # @param timestamp Capture time of the frame, defaults to now (time.time())
+    # @return seq Sequence number given to the frame
+    def publish(self, frame, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        seq = int(self.header['latest']) + 1
+        slot = seq % len(self.table)
+        # readers see -1 while the slot is being written
+        self.table[slot]['seq'] = -1
+        np.copyto(self.frames[slot], frame)
+        self.table[slot]['timestamp'] = timestamp
+        self.table[slot]['seq'] = seq
+        self.header['latest'] = seq
+        return seq
+
+    ##
+    # @brief unmaps and removes the shared memory. Readers still attached keep working until they close
+    def close(self):
+        del self.header, self.table, self.frames
+        self.shm.close()
+        # readers forked from this process share its resource tracker and took the block off it (see attachBus)
+        resource_tracker.register(self.shm._name, 'shared_memory')
+        self.shm.unlink()
+
+
+class FrameBusReader:
+    ##
+    # @param name Name of the bus given to the FrameBusWriter
+    # @param timeout Seconds to keep retrying while the writer has not created the bus, or not filled in its header, yet
+    def __init__(self, name, timeout=5.0):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                self.shm = attachBus(name)
+                break
+            except FileNotFoundError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.01)
+        self.name = name
+        header = np.ndarray((), FrameBusWriter.headerType, buffer=self.shm.buf)
+        # the block exists before the writer has filled in the header
+        while int(header['magic']) != busMagic:
+            if time.time() > deadline:
+                del header
+                self.shm.close()
+                raise TimeoutError("Frame bus %s was created but its header was not filled in within %g s" % (name, timeout))
+            time.sleep(0.01)
+        slots = int(header['slots'])
+        shape = (int(header['rows']), int(header['cols']))
+        if header['channels'] > 0:
+            shape += (int(header['channels']),)
+        dtype = np.dtype(header['dtype'].item().decode())
+        self.header, self.table, self.frames = mapBus(self.shm, slots, shape, dtype)
+        # the frames belong to the writer
+        self.frames.flags.writeable = False
+
+    ##
+    # @return Sequence number of the newest published frame, -1 if none
+    def getLatest(self):
+        return int(self.header['latest'])
+
+    ##
+    # @brief gives the newest frame without copying it
+    # @param after Only return a frame newer than this sequence number
+    # @param timeout Seconds to wait for such a frame, None waits forever
+    # @return seq Sequence number of the frame, None if the timeout ran out
+    # @return timestamp Capture time of the frame
+    # @return frame Read only view into the shared memory. It stays valid while isValid(seq) is True
+    def read(self, after=-1, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            seq = int(self.header['latest'])
+            if seq > after:
+                slot = seq % len(self.table)
+                timestamp = float(self.table[slot]['timestamp'])
+                # the writer may have moved on to this slot again while we looked it up
+                if int(self.table[slot]['seq']) == seq:
+                    return seq, timestamp, self.frames[slot]
+                continue
+            if deadline is not None and time.time() > deadline:
+                return None, None, None
+            time.sleep(0.001)
+
+    ##
+    # @brief checks that a frame returned by read has not been overwritten yet
+    # @param seq Sequence number returned by read
+    # @return True if the view still holds frame seq
+    def isValid(self, seq):
+        return int(self.table[seq % len(self.table)]['seq']) == seq
+
+    def close(self):
+        del self.header, self.table, self.frames
+        self.shm.close()
+
+
+class FramePublisher:
+    ##
+    # @brief publishes the frames of any Camera onto a frame bus
+    # @param camera Camera subclass instance to read frames from
+    # @param name Name of the bus
+    # @param slots Number of frames kept in the ring
+    # @post the first frame is read to size the bus, and is published
+    def __init__(self, camera, name, slots=4):
+        self.camera = camera
+        frame = self.nextFrame()
+        if frame is None:
+            raise IOError("Camera %s gave no frame to size the frame bus" % camera.getName())
+        self.writer = FrameBusWriter(name, frame.shape, frame.dtype, slots)
+        self.writer.publish(frame)
+        self.running = False
+        self.thread = None
+
+    ##
+    # @return next frame of the camera, None if it has no more frames
+    def nextFrame(self):
+        result = self.camera.getFrame()
+        # video cameras return (success, frame), image cameras just the frame
+        if isinstance(result, tuple):
+            success, frame = result
+            return frame if success else None
+        return result
+
+    ##
+    # @brief publishes camera frames until the camera runs out, stop is called or max_frames were sent
+    # @param max_frames Number of frames to publish, None for no limit
+    # @param fps Publish rate limit, None publishes as fast as the camera delivers
+    def run(self, max_frames=None, fps=None):
+        self.running = True
+        count = 0
+        while self.running and (max_frames is None or count < max_frames):
+            start = time.time()
+            frame = self.nextFrame()
+            if frame is None:
+                break
+            self.writer.publish(frame, start)
+            count += 1
+            if fps is not None:
+                time.sleep(max(0, 1.0/fps - (time.time() - start)))
+        self.running = False
+
+    ##
+    # @brief runs the publisher on a background thread
+    def start(self, max_frames=None, fps=None):
+        self.thread = threading.Thread(target=self.run, args=(max_frames, fps), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.writer.close()
+
+
+##
+# @brief maps the header, slot table and frame ring onto a shared memory block
+# @return header, table, frames NumPy views into the block
+def mapBus(shm, slots, shape, dtype):
+    header = np.ndarray((), FrameBusWriter.headerType, buffer=shm.buf)
+    offset = FrameBusWriter.headerType.itemsize
+    table = np.ndarray((slots,), FrameBusWriter.slotType, buffer=shm.buf, offset=offset)
+    offset += slots*FrameBusWriter.slotType.itemsize
+    frames = np.ndarray((slots,) + shape, dtype, buffer=shm.buf, offset=offset)
+    return header, table, frames
+
+
+##
+# @brief attaches to an existing shared memory block without taking ownership of it
+def attachBus(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # older Pythons register attached blocks too and would remove the writer's block when a reader exits
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
@@ -0,0 +1,82 @@
+# frame_queue.py - Bounded, thread safe ring buffer used to hand frames from a
+#                  capture thread to the processing thread.
+import threading
+from collections import deque
+
+
+class FrameQueue:
+    ##
+    # @param size Number of frames the ring can hold
+    # @param mode 'drop' (live camera): a full ring drops its oldest frame and get
+    #        always returns the freshest one. 'lossless' (file replay): a full ring
+    #        blocks the producer and get returns frames in order
+    def __init__(self, size=4, mode='drop'):
+        if mode not in ('drop', 'lossless'):
+            raise ValueError("FrameQueue mode must be 'drop' or 'lossless', not '%s'" % mode)
+        self.size = size
+        self.mode = mode
+        self.frames = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.pushed = 0
+
+    ##
+    # @brief adds a frame, dropping or waiting if the ring is full depending on the mode
+    # @param item Frame (or any object) to queue
+    # @return False if the queue was closed and the item was not added
+    def put(self, item):
+        with self.cond:
+            if self.mode == 'lossless':
+                while len(self.frames) >= self.size and not self.closed:
+                    self.cond.wait()
+            if self.closed:
+                return False
+            if len(self.frames) >= self.size:
+                self.frames.popleft()
+                self.dropped += 1
+            self.frames.append(item)
+            self.pushed += 1
+            self.cond.notify_all()
+            return True
+
+    ##
+    # @brief takes the next frame, waiting for one if the ring is empty
+    # @param timeout Seconds to wait, None waits until a frame arrives or the queue is closed
+    # @return The oldest frame (lossless) or the freshest frame (drop), None if the queue
+    #         is closed and empty or the timeout ran out
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.frames or self.closed, timeout):
+                return None
+            if not self.frames:
+                return None
+            if self.mode == 'drop':
+                # older frames are stale for a live camera, skip straight to the newest
+                item = self.frames.pop()
+                self.dropped += len(self.frames)
+                self.frames.clear()
+            else:
+                item = self.frames.popleft()
+            self.cond.notify_all()
+            return item
+
+    ##
+    # @brief stops the queue: producers are released and get returns None once it is empty
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def isClosed(self):
+        return self.closed
+
+    def getDepth(self):
+        with self.cond:
+            return len(self.frames)
+
+    def getDropped(self):
+        return self.dropped
+
+    def getPushed(self):
+        return self.pushed
@@ -0,0 +1,183 @@
+'''
+hog_features.py - HOG feature extraction for whole training sets.  A
+cv2.HOGDescriptor is built once per parameter set (and once per worker
+process) instead of once per call, and the features of a batch of images
+are written straight into one preallocated (N, D) float32 matrix, the
+layout cv2.ml expects for its training samples.  Large sets of image files
+are read, resized and described in chunks spread over a process pool.
+HOG needs an OpenCV build that has HOGDescriptor: the opencv-python
+(or opencv-contrib-python) 3.x and 4.x packages do, but OpenCV 5 dropped it
+from the main modules, so where it lives is probed once, on import.
+'''
+import os
+from multiprocessing import Pool
+import numpy as np
+import cv2
+
+# HOG parameters of the buoy classifier. The window is the size training images are resized to,
+# so every image gives exactly one descriptor
+defaultParams = (('winSize', (64, 128)),
+                 ('blockSize', (8, 8)),
+                 ('blockStride', (4, 4)),
+                 ('cellSize', (8, 8)),
+                 ('nbins', 9),
+                 ('derivAperture', 1),
+                 ('winSigma', -1.),
+                 ('histogramNormType', 0),
+                 ('L2HysThreshold', 0.2),
+                 ('gammaCorrection', 1),
+                 ('nlevels', 64),
+                 ('signedGradient', True))
+
+imageExtensions = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# HOGDescriptors made so far in this process, by parameter set
+descriptors = {}
+
+
+##
+# @brief finds the HOGDescriptor class of this OpenCV build
+# @return HOGDescriptor class, None if this build has no HOG
+def probeDescriptor():
+    if hasattr(cv2, 'HOGDescriptor'):
+        return cv2.HOGDescriptor
+    # contrib builds of OpenCV 5 keep HOG with the other extra detectors
+    xobjdetect = getattr(cv2, 'xobjdetect', None)
+    return getattr(xobjdetect, 'HOGDescriptor', None)
+
+
+# probed once for the whole process
+hogDescriptorClass = probeDescriptor()
+
+
+##
+# @brief makes a full parameter set from the defaults
+# @param params dictionary of the parameters that differ from defaultParams, or a parameter set from an earlier call
+# @return params tuple of (name, value) pairs in HOGDescriptor argument order, usable as a dictionary key
+def hogParams(params=None):
+    if params is None:
+        return defaultParams
+    params = dict(params)
+    return tuple((name, params.get(name, value)) for name, value in defaultParams)
+
+
+##
+# @brief returns the HOGDescriptor of a parameter set, making it the first time
+# @param params see hogParams
+# @return hog cv2.HOGDescriptor
+def getDescriptor(params=None):
+    if hogDescriptorClass is None:
+        raise RuntimeError("OpenCV %s has no HOGDescriptor. HOG features need opencv-python or "
+                           "opencv-contrib-python 4.x (pip install 'opencv-contrib-python<5')" % cv2.__version__)
+    params = hogParams(params)
+    hog = descriptors.get(params)
+    if hog is None:
+        hog = hogDescriptorClass(*[value for name, value in params])
+        descriptors[params] = hog
+    return hog
+
+
+##
+# @param params see hogParams
+# @return D length of the feature vector of one image
+def featureLength(params=None):
+    return getDescriptor(params).getDescriptorSize()
+
+
+##
+# @brief computes the HOG features of a batch of images
+# @param images sequence (or (N, H, W[, C]) array) of images, all the size of the HOG window
+# @param params see hogParams
+# @param out (N, D) float32 matrix to write the features to, made if None
+# @return features (N, D) float32 matrix, one row per image
+def computeHog(images, params=None, out=None):
+    hog = getDescriptor(params)
+    if out is None:
+        out = np.empty((len(images), hog.getDescriptorSize()), dtype=np.float32)
+    for i, image in enumerate(images):
+        out[i] = hog.compute(image).reshape(-1)
+    return out
+
+
+##
+# @brief reads, resizes and describes image files, one chunk of a training set
+# @param fileNames paths of the images
+# @param size (width, height) the images are resized to, the HOG window size
+# @param params see hogParams
+# @return features (n, D) float32 matrix, rows of unreadable files are left 0
+# @return readable (n,) bool array, False for the files that could not be read
+def hogFiles(fileNames, size=None, params=None):
+    params = hogParams(params)
+    if size is None:
+        size = dict(params)['winSize']
+    hog = getDescriptor(params)
+    features = np.zeros((len(fileNames), hog.getDescriptorSize()), dtype=np.float32)
+    readable = np.zeros(len(fileNames), dtype=bool)
+    # one resize buffer for the whole chunk
+    resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+    for i, fileName in enumerate(fileNames):
+        image = cv2.imread(fileName)
+        if image is None:
+            continue
+        if image.shape[1::-1] != tuple(size):
+            image = cv2.resize(image, tuple(size), dst=resized)
+        features[i] = hog.compute(image).reshape(-1)
+        readable[i] = True
+    return features, readable
+
+
+##
+# @brief unpacks the arguments of a pool task
+def hogChunk(task):
+    start, fileNames, size, params = task
+    features, readable = hogFiles(fileNames, size, params)
+    return start, features, readable
+
+
+##
+# @brief lists the image files of a directory, in a stable order
+# @param directory folder of training images
+# @return fileNames sorted paths of the images in the folder
+def listImages(directory):
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(imageExtensions)]
+
+
+##
+# @brief HOG features of a whole set of image files
+# @param fileNames paths of the images, or a directory of images
+# @param size (width, height) the images are resized to, the HOG window size by default
+# @param params see hogParams
+# @param processes number of worker processes, None for one per CPU. Small sets are always done in this process
+# @param chunk number of images given to a worker at a time
+# @param min_parallel smallest number of images worth starting a process pool for
+# @return features (N, D) float32 matrix, one row per readable image
+# @return fileNames paths of the images the rows belong to
+def extractHog(fileNames, size=None, params=None, processes=None, chunk=256, min_parallel=1024):
+    if isinstance(fileNames, str):
+        fileNames = listImages(fileNames)
+    params = hogParams(params)
+    if size is None:
+        size = dict(params)['winSize']
+    features = np.empty((len(fileNames), featureLength(params)), dtype=np.float32)
+    readable = np.empty(len(fileNames), dtype=bool)
+    tasks = [(start, fileNames[start:start+chunk], size, params) for start in range(0, len(fileNames), chunk)]
+    if len(fileNames) < min_parallel or processes == 1 or (processes is None and (os.cpu_count() or 1) == 1):
+        results = map(hogChunk, tasks)
+        pool = None
+    else:
+        pool = Pool(processes)
+        results = pool.imap_unordered(hogChunk, tasks)
+    try:
+        # every chunk is copied into its rows of the one big matrix as soon as it is done
+        for start, chunkFeatures, chunkReadable in results:
+            features[start:start+len(chunkFeatures)] = chunkFeatures
+            readable[start:start+len(chunkReadable)] = chunkReadable
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if not readable.all():
+        features = features[readable]
+        fileNames = [name for name, ok in zip(fileNames, readable) if ok]
+    return features, fileNames
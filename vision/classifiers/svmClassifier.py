@@ -1,9 +1,10 @@
 # svmClassifier.py - This is a 'test' classifier that will take in a single feature vector
 #                      and classify an object in a frame
-import os
+import numpy as np
 import cv2
 # import imutils
 from .classifier import Classifier
+from .hog_features import extractHog
 
 
 class svmClassifier(Classifier):
@@ -42,91 +43,51 @@ class svmClassifier(Classifier):
     # @brief load data given what object is needed to be classified
     # @param userMask the desired object shape to be classified
     # @param userColor the desire object color to be classified
-    # @param SZ
-    # @param BIN_N number of bins
-    # @return trained_model svm model for feature vector to be compared to
-    def loadData(self, userMask, userColor, SZX=64, SZY=128 BIN_N=10):
+    # @param SZX width training images are resized to, the HOG window width
+    # @param SZY height training images are resized to, the HOG window height
+    # @param processes number of processes computing the HOG features, None for one per CPU
+    # @return features (N, D) float32 matrix of HOG features, one row per training image
+    # @return labels (N,) int32 labels of the training images
+    # @return fileNames paths of the training images the rows belong to
+    def loadData(self, userMask, userColor, SZX=64, SZY=128, processes=None):
         #determine how the svm will be trained
         #training images are in files associated with what is needed to be classified
         #for example, an orange circle has its own set of training images. Additional training files can be made as needed
-        if userMask == 0 & userColor == 0:
+        if userMask == 0 and userColor == 0:
             train_features_file = "/home/oren/vision/tests/test_files/orange_ball_training"
-        #elif userMask == 1 & userColor == 1:
+        #elif userMask == 1 and userColor == 1:
             #train_features_file = /path/green_square_training(example)
         else:
             print("INPUT PARAMETERS NOT DEFINED")
-
-        print('Defining HoG Parameters ... ')
-        winSize = (20,20)
-        blockSize = (8,8)
-        blockStride = (4,4)
-        cellSize = (8,8)
-        nbins = 9
-        derivAperture = 1
-        winSigma = -1.
-        histogramNormType = 0
-        L2HysThreshold = 0.2
-        gammaCorrection = 1
-        nlevels = 64
-        signedGradient = True
-
-        hog = cv2.HOGDescriptor(winSize,blockSize,blockStride,cellSize,nbins,derivAperture,winSigma,histogramNormType,L2HysThreshold,gammaCorrection,nlevels, signedGradient)
+            return None, None, None
 
         print('Loading SVM Training Data ... ')
-        #cycle through training images in folder and split image data into training and testing data
-        for file in os.listdir(train_features_file):
-            #FIXME replace directory with train_features file
-            filename = os.fsdecode(file)
-            dirname = os.fsdecode(directory)
-            filefile = os.path.join(dirname, filename)
-            subimage = cv2.imread(str(filefile))
-            subimage = cv2.resize(subimage, (SZX, SZY))
-
-            curr_feat, feat_size = tools.getAllHog(subimage,
-                                                stridex,
-                                                stridey,
-                                                szx,
-                                                szy,
-                                                cell_size,
-                                                block_size,
-                                                nbins)
-            curr_feat = curr_feat.reshape((feat_size, 1))
-
-            trainfeats.append(curr_feat)
-            trainlabels.append(1)
-            trainimages.append(subimage)
+        #every image is read, resized and described in worker processes, straight into one (N, D) matrix
+        #the HOG window is the training image size, so each image gives one descriptor
+        features, fileNames = extractHog(train_features_file, (SZX, SZY), {'winSize': (SZX, SZY)}, processes)
+        labels = np.ones(len(fileNames), dtype=np.int32)
 
+        return features, labels, fileNames
 
     ##
     # @brief train SVM model
     # @param model untrained svm model
-    # @param img
-    # @param objects_deskewed
+    # @param hog_descriptors (N, D) float32 HOG features from loadData
+    # @param labels (N,) labels from loadData
+    # @param objects training images (or their file names) the features belong to
     # @return trained_model trained SVM model
-    def trainSVM(model, img, objects_deskewed):
-
-
-
-        print('Calculating HoG descriptor for each image ... ')
-        hog_descriptors = []
-        #FIXME this is used inf vision_tools is not None
-        RBG = self.vision_tools.getAverageColor(image)
-        gray_image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        for img in objects_deskewed:
-            hog_descriptors.append(hog.compute(img))
-        #FIXME remove line below and put into somethingx1 matrix
-        hog_descriptors = np.squeeze(hog_descriptors)
-
+    # @return objects_test, hog_descriptors_test, labels_test the 10% held out for classify
+    def trainSVM(self, model, hog_descriptors, labels, objects):
         print('Splitting data into training (90%) and test set (10%) ... ')
         train_n = int(0.9*len(hog_descriptors))
-        objects_train, objects_test = np.split(objects_deskewed, [train_n])
+        objects_train, objects_test = objects[:train_n], objects[train_n:]
         hog_descriptors_train, hog_descriptors_test = np.split(hog_descriptors, [train_n])
         labels_train, labels_test = np.split(labels, [train_n])
 
         print('Training SVM model ... ')
-        trained_model = model.train(hog_descriptors_train, cv2.ml.ROW_SAMPLE, labels_train)
+        model.train(hog_descriptors_train, cv2.ml.ROW_SAMPLE, labels_train)
 
-        return trained_model, objects_test, hog_descriptors_test, labels_test)
+        return model, objects_test, hog_descriptors_test, labels_test
 
     ##
     # @brief evaluate trained SVM model to classify object
@@ -134,10 +95,10 @@ class svmClassifier(Classifier):
     # @param objects_test
     # @param hog_descriptors_test
     # @param labels_test
-    def classify(trained_model, objects_test, hog_descriptors_test, labels_test):
+    def classify(self, trained_model, objects_test, hog_descriptors_test, labels_test):
         print('Evaluating Model ... ')
-        predictions = trained_model.predict(trained_model, hog_descriptors_test)
-        accuracy = (labels == predictions).mean()
+        predictions = trained_model.predict(hog_descriptors_test)[1].ravel()
+        accuracy = (labels_test == predictions).mean()
         print('Percentage Accuracy: %.2f %%' % (accuracy*100))
         confusion = np.zeros((10, 10), np.int32)
         for i, j in zip(labels_test, predictions):
@@ -147,24 +108,12 @@ class svmClassifier(Classifier):
 
         final = []
         for img, flag in zip(objects_test, predictions == labels_test):
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BRG)
+            if isinstance(img, str):
+                img = cv2.imread(img)
+            elif img.ndim == 2:
+                img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
             if not flag:
                 img[...,:2] = 0
             final.append(img)
 
         return final
-
-
-
-
-f
-
-
-
-
-
-
-
-
-
-
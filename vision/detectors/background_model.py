@@ -0,0 +1,112 @@
+'''
+background_model.py - Running per pixel background color model.  The mean
+and variance of every pixel are exponential moving averages kept in float
+buffers that are allocated once, and a pixel is foreground when any of its
+channels is further than k standard deviations from the background mean.
+The model starts out as the first frame itself, with a +-50 tolerance
+(the tolerance BuoyBoxes used around the frame's average color).  Background
+pixels are learned at the normal rate and foreground pixels at a much
+smaller one, so an object that stops moving fades out only slowly while a
+scene that really changed is learned in the end.  When most of the frame
+stays foreground (a lighting change, a turn of the sub) the model starts
+over from the current frame.
+'''
+import numpy as np
+import cv2
+
+
+class BackgroundModel:
+    ##
+    # @param alpha weight of a new frame in the running mean and variance
+    # @param k number of standard deviations a channel may be off the mean and still be background
+    # @param init_std standard deviation the model starts with (k*init_std is the starting tolerance)
+    # @param min_std smallest standard deviation kept, so a very steady pixel does not become foreground on sensor noise
+    # @param fg_alpha weight of a new frame in the mean and variance of the pixels that are foreground
+    # @param max_foreground fraction of the frame above which the foreground is taken for a change of the whole scene
+    # @param reseed_frames frames in a row with more than max_foreground foreground after which the model starts over
+    def __init__(self, alpha=0.02, k=2.5, init_std=20.0, min_std=4.0, fg_alpha=0.002, max_foreground=0.6, reseed_frames=10):
+        self.alpha = alpha
+        self.fg_alpha = fg_alpha
+        self.max_foreground = max_foreground
+        self.reseed_frames = reseed_frames
+        self.k = k
+        self.init_std = init_std
+        self.min_std = min_std
+        self.mean = None
+        self.frames = 0
+
+    ##
+    # @brief makes the buffers and seeds the model with a frame, pixel by pixel
+    # @param frame first BGR frame
+    def reset(self, frame):
+        shape = frame.shape
+        self.mean = np.empty(shape, dtype=np.float32)
+        self.var = np.empty(shape, dtype=np.float32)
+        self.diff = np.empty(shape, dtype=np.float32)
+        self.limit = np.empty(shape, dtype=np.float32)
+        self.over = np.empty(shape, dtype=np.uint8)
+        self.foreground = np.empty(shape[:2], dtype=np.uint8)
+        self.background = np.empty(shape[:2], dtype=np.uint8)
+        channels = shape[2] if len(shape) > 2 else 1
+        self.sumChannels = np.ones((1, channels), dtype=np.float32)
+        self.reseed(frame)
+
+    ##
+    # @brief starts the model over from a frame of the same size, keeping the buffers
+    # @param frame BGR frame
+    def reseed(self, frame):
+        np.copyto(self.mean, frame)
+        self.var[:] = self.init_std**2
+        self.frames = 0
+        # frames in a row that were mostly foreground
+        self.crowded = 0
+
+    ##
+    # @brief finds the foreground of a frame and learns the background from the rest of it
+    # @param frame BGR frame, the same size every call (a new size restarts the model)
+    # @param learn update the model with this frame
+    # @return foreground uint8 mask, 255 where the pixel is not background. The buffer is reused by the next call
+    def apply(self, frame, learn=True):
+        if self.mean is None or self.mean.shape != frame.shape:
+            self.reset(frame)
+        np.copyto(self.diff, frame)
+        cv2.absdiff(self.diff, self.mean, dst=self.diff)
+        # a pixel is foreground when any channel is beyond k standard deviations
+        cv2.sqrt(self.var, dst=self.limit)
+        cv2.multiply(self.limit, self.k, dst=self.limit)
+        cv2.compare(self.diff, self.limit, cv2.CMP_GT, dst=self.over)
+        if self.over.ndim == 3:
+            # adding the 0/255 channels up saturates at 255
+            cv2.transform(self.over, self.sumChannels, dst=self.foreground)
+        else:
+            np.copyto(self.foreground, self.over)
+        if learn:
+            if cv2.countNonZero(self.foreground) > self.max_foreground*self.foreground.size:
+                self.crowded += 1
+            else:
+                self.crowded = 0
+            if self.crowded >= self.reseed_frames:
+                # the whole scene changed, nothing of the old background is left to learn from
+                self.reseed(frame)
+                self.foreground[:] = 0
+                return self.foreground
+            # foreground pixels are learned too, but slowly, so an object that stops moving only fades out after a while
+            cv2.bitwise_not(self.foreground, dst=self.background)
+            cv2.multiply(self.diff, self.diff, dst=self.diff)
+            cv2.accumulateWeighted(self.diff, self.var, self.alpha, mask=self.background)
+            cv2.accumulateWeighted(self.diff, self.var, self.fg_alpha, mask=self.foreground)
+            np.maximum(self.var, self.min_std**2, out=self.var)
+            cv2.accumulateWeighted(frame, self.mean, self.alpha, mask=self.background)
+            cv2.accumulateWeighted(frame, self.mean, self.fg_alpha, mask=self.foreground)
+            self.frames += 1
+        return self.foreground
+
+    ##
+    # @return mean float32 image of the background mean
+    def getBackground(self):
+        return self.mean
+
+    ##
+    # @return number of frames the model has learned from
+    def getFrameCount(self):
+        return self.frames
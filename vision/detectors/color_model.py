@@ -0,0 +1,147 @@
+'''
+color_model.py - Adaptive color model.  Each named color is a Gaussian in
+BGR space (mean and covariance) that starts out covering the fixed range of
+the color segmenter and then follows the object's color as it drifts with
+depth and turbidity, learning from confirmed detections only.  Pixels and
+ROI colors are classified by their Mahalanobis distance to the Gaussian.  A
+sample whose mean falls outside the current gate is not learned, so the
+model cannot walk off the object onto the water around it.
+'''
+import numpy as np
+import cv2
+
+
+class AdaptiveColorModel:
+    ##
+    # @param colorSegmenter ColorSegmenter whose ranges seed the model of each color
+    # @param alpha weight of a new sample in the running statistics (0 never adapts, 1 forgets everything)
+    # @param threshold largest Mahalanobis distance (in standard deviations) of a color that belongs to the class
+    # @param min_var smallest variance kept on each channel so the covariance never collapses onto a flat ROI
+    def __init__(self, colorSegmenter, alpha=0.05, threshold=3.0, min_var=4.0):
+        self.colorSegmenter = colorSegmenter
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_var = min_var
+        # color name -> mean (3,), covariance (3, 3), whitening transform (3, 4) and number of updates
+        self.means = {}
+        self.covs = {}
+        self.transforms = {}
+        self.updates = {}
+        # float copy of the frame and per pixel buffers used by mask, sized for the biggest image masked so far
+        self.floatFrame = None
+        self.whitened = None
+        self.dist = None
+        for name in colorSegmenter.getColors():
+            self.reset(name)
+
+    ##
+    # @brief puts a color back to the fixed range of the color segmenter: the mean at the center of the
+    #        range and the covariance of the ellipsoid through the corners of the range at threshold
+    # @param name name of the color
+    def reset(self, name):
+        lower, upper = self.colorSegmenter.getRange(name)
+        lower = lower.astype(np.float64)
+        upper = upper.astype(np.float64)
+        sigma = (upper - lower)/2*np.sqrt(3)/self.threshold
+        self.setStats(name, (lower + upper)/2, np.diag(sigma**2))
+        self.updates[name] = 0
+
+    ##
+    # @brief stores the statistics of a color and builds its whitening transform
+    # @param name name of the color
+    # @param mean (3,) mean BGR value
+    # @param cov (3, 3) covariance
+    def setStats(self, name, mean, cov):
+        cov = (cov + cov.T)/2 + np.eye(3)*self.min_var
+        self.means[name] = mean
+        self.covs[name] = cov
+        # W with W^T W = cov^-1, so the squared distance of x is |W (x - mean)|^2
+        W = np.linalg.cholesky(np.linalg.inv(cov)).T
+        self.transforms[name] = np.hstack([W, (-W @ mean)[:, None]]).astype(np.float32)
+
+    ##
+    # @param name name of the color
+    # @return mean, covariance of the color
+    def getStats(self, name):
+        if name not in self.means:
+            raise ValueError("No color model for color '%s'" % name)
+        return self.means[name], self.covs[name]
+
+    ##
+    # @brief blends the colors of a confirmed detection into the running statistics of its color
+    # @param name name of the color that was confirmed
+    # @param pixels ROI image (or (N, 3) array) of pixels that belong to the object
+    # @param mask optional mask of the ROI, only pixels where it is non zero are used
+    # @return True if the sample was learned, False if it had too few pixels or its mean was outside the gate
+    def update(self, name, pixels, mask=None):
+        mean, cov = self.getStats(name)
+        pixels = np.asarray(pixels)
+        if mask is not None:
+            pixels = pixels[mask > 0]
+        pixels = pixels.reshape(-1, 3).astype(np.float64)
+        if len(pixels) < 2:
+            return False
+        sample_mean = pixels.mean(axis=0)
+        if self.distance(name, sample_mean)[0] > self.threshold**2:
+            return False
+        sample_cov = np.cov(pixels, rowvar=False)
+        shift = sample_mean - mean
+        new_mean = mean + self.alpha*shift
+        # running covariance about the moving mean
+        new_cov = (1 - self.alpha)*(cov + self.alpha*np.outer(shift, shift)) + self.alpha*sample_cov
+        # setStats adds min_var back on, keep it from piling up
+        self.setStats(name, new_mean, new_cov - np.eye(3)*self.min_var)
+        self.updates[name] += 1
+        return True
+
+    ##
+    # @brief squared Mahalanobis distances of colors to a color's model
+    # @param name name of the color
+    # @param colors (N, 3) array of BGR values (e.g. ROI averages)
+    # @return dist (N,) array of squared distances
+    def distance(self, name, colors):
+        mean, cov = self.getStats(name)
+        diff = np.asarray(colors, dtype=np.float64).reshape(-1, 3) - mean
+        W = self.transforms[name][:, :3].astype(np.float64)
+        return np.sum((diff @ W.T)**2, axis=1)
+
+    ##
+    # @brief checks a single color value, e.g. the average color of an ROI
+    # @param color [B, G, R] value
+    # @param name name of the color
+    # @return True if color is within threshold standard deviations of the color's model
+    def contains(self, color, name):
+        return bool(self.distance(name, np.asarray(color)[:3])[0] <= self.threshold**2)
+
+    ##
+    # @brief finds the model closest to a color value
+    # @param color [B, G, R] value
+    # @return name of the closest color within threshold, None if no model holds the color
+    def classify(self, color):
+        names = list(self.means)
+        dist = np.array([self.distance(name, np.asarray(color)[:3])[0] for name in names])
+        best = int(np.argmin(dist))
+        return names[best] if dist[best] <= self.threshold**2 else None
+
+    ##
+    # @brief mask of the pixels that fit a color's model
+    # @param frame BGR image
+    # @param name name of the color
+    # @return mask new uint8 image, 255 where the pixel is within threshold of the model, 0 elsewhere
+    def mask(self, frame, name):
+        self.getStats(name)
+        if self.floatFrame is not None and self.floatFrame.shape == frame.shape:
+            floatFrame, whitened, dist = self.floatFrame, self.whitened, self.dist
+        else:
+            floatFrame = np.empty(frame.shape, dtype=np.float32)
+            whitened = np.empty(frame.shape, dtype=np.float32)
+            dist = np.empty(frame.shape[:2], dtype=np.float32)
+            # smaller images (the ROIs of updateColorModel between frames) get temporaries and leave the frame's buffers be
+            if self.floatFrame is None or frame.size > self.floatFrame.size:
+                self.floatFrame, self.whitened, self.dist = floatFrame, whitened, dist
+        np.copyto(floatFrame, frame)
+        # whiten every pixel, square and add up the channels: squared Mahalanobis distance per pixel
+        cv2.transform(floatFrame, self.transforms[name], dst=whitened)
+        cv2.multiply(whitened, whitened, dst=whitened)
+        cv2.transform(whitened, np.ones((1, 3), dtype=np.float32), dst=dist)
+        return cv2.compare(dist, self.threshold**2, cv2.CMP_LE)
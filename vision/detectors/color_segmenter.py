@@ -0,0 +1,147 @@
+'''
+color_segmenter.py - Named BGR color ranges, compiled once, and segmentation
+of a frame against all of them in a single pass.  Every range is a box in BGR
+space, so a pixel is inside it when each of its channels is inside the range
+of that channel.  Each color gets one bit; one lookup table per channel gives
+the bits of the colors whose range holds that channel value, and AND-ing the
+three channels gives the colors that hold the whole pixel.
+'''
+import json
+import numpy as np
+import cv2
+
+
+class ColorSegmenter:
+    #note: will have to adjust thresholds for specific cases. Color code is [B, G, R]
+    # color name -> (lower range, upper range)
+    defaultRanges = {"orange": ([50, 70, 137], [125, 181, 255]),
+                     "red": ([13, 13, 168], [101, 101, 242]),
+                     "blue": ([127, 17, 17], [224, 116, 116]),
+                     "green": ([13, 155, 13], [111, 232, 111])}
+    # colors have to fit in the bits of a uint8 bitmask
+    maxColors = 8
+
+    ##
+    # @param ranges {color name: (lower, upper)} BGR ranges. Defaults to defaultRanges
+    def __init__(self, ranges=None):
+        if ranges is None:
+            ranges = self.defaultRanges
+        # color name -> (lower, upper) uint8 arrays, in bit order
+        self.ranges = {}
+        for name, (lower, upper) in ranges.items():
+            self.addColor(name, lower, upper)
+        # output buffers, reallocated only when the frame size changes
+        self.bits = None
+        self.labels = None
+
+    ##
+    # @brief builds a segmenter from a JSON file of the form {"orange": {"lower": [B, G, R], "upper": [B, G, R]}, ...}
+    # @param fileName path of the JSON file
+    # @return segmenter ColorSegmenter with the colors of the file, in file order
+    @classmethod
+    def fromConfig(cls, fileName):
+        with open(fileName) as f:
+            config = json.load(f)
+        return cls({name: (entry["lower"], entry["upper"]) for name, entry in config.items()})
+
+    ##
+    # @brief adds a color (or replaces its range) and recompiles the lookup tables
+    # @param name name of the color
+    # @param lower [B, G, R] lowest value of each channel, inclusive
+    # @param upper [B, G, R] highest value of each channel, inclusive
+    def addColor(self, name, lower, upper):
+        if name not in self.ranges and len(self.ranges) >= self.maxColors:
+            raise ValueError("A ColorSegmenter holds at most %d colors" % self.maxColors)
+        self.ranges[name] = (np.array(lower, dtype=np.uint8), np.array(upper, dtype=np.uint8))
+        self.compile()
+
+    ##
+    # @brief builds the per channel bit tables and the bitmask -> label table
+    def compile(self):
+        values = np.arange(256)
+        # lut[0, v, c] has bit i set when value v of channel c is inside the range of color i
+        self.lut = np.zeros((1, 256, 3), dtype=np.uint8)
+        for bit, (lower, upper) in enumerate(self.ranges.values()):
+            inside = (values[:, None] >= lower) & (values[:, None] <= upper)
+            self.lut[0] |= (inside << bit).astype(np.uint8)
+        # bitmask -> index + 1 of its lowest set bit (the first color in order wins), 0 for no color
+        bitmasks = np.arange(256)
+        self.labelLut = np.zeros(256, dtype=np.uint8)
+        for bit in reversed(range(len(self.ranges))):
+            self.labelLut[(bitmasks >> bit) & 1 == 1] = bit + 1
+
+    ##
+    # @return names of the colors, in bit (and label) order
+    def getColors(self):
+        return list(self.ranges)
+
+    ##
+    # @param name name of the color
+    # @return lower, upper BGR range of the color
+    def getRange(self, name):
+        if name not in self.ranges:
+            raise ValueError("No color range defined for color '%s'" % name)
+        return self.ranges[name]
+
+    ##
+    # @param name name of the color
+    # @return bit bitmask value of the color in the images returned by segment
+    def getBit(self, name):
+        self.getRange(name)
+        return 1 << self.getColors().index(name)
+
+    ##
+    # @brief checks a single color value, e.g. the average color of an ROI
+    # @param color [B, G, R] value
+    # @param name name of the color
+    # @return True if every channel of color is inside the range of the color
+    def contains(self, color, name):
+        lower, upper = self.getRange(name)
+        color = np.asarray(color)[:3]
+        return bool(np.all((lower <= color) & (color <= upper)))
+
+    ##
+    # @brief mask of a single color, same as cv2.inRange with the color's range
+    # @param frame BGR image
+    # @param name name of the color
+    # @return mask new uint8 image, 255 where the pixel is inside the range, 0 elsewhere
+    def mask(self, frame, name):
+        lower, upper = self.getRange(name)
+        return cv2.inRange(frame, lower, upper)
+
+    ##
+    # @brief labels every pixel with all the colors it falls in, in one pass over the frame
+    # @param frame BGR image
+    # @return bits uint8 image, bit i is set where the pixel is inside the range of color i.
+    #         The buffer is reused by the next call
+    def segment(self, frame):
+        if self.bits is None or self.bits.shape != frame.shape[:2]:
+            self.channelBits = np.empty(frame.shape[:2] + (3,), dtype=np.uint8)
+            self.bits = np.empty(frame.shape[:2], dtype=np.uint8)
+        cv2.LUT(frame, self.lut, dst=self.channelBits)
+        np.bitwise_and(self.channelBits[:, :, 0], self.channelBits[:, :, 1], out=self.bits)
+        np.bitwise_and(self.bits, self.channelBits[:, :, 2], out=self.bits)
+        return self.bits
+
+    ##
+    # @brief one mask per color from a single segmentation pass
+    # @param frame BGR image
+    # @param names colors to return, defaults to all of them
+    # @return masks {color name: new uint8 image, 255 inside the range, 0 elsewhere}
+    def masks(self, frame, names=None):
+        if names is None:
+            names = self.getColors()
+        bits = self.segment(frame)
+        return {name: cv2.compare(cv2.bitwise_and(bits, self.getBit(name)), 0, cv2.CMP_GT) for name in names}
+
+    ##
+    # @brief single label per pixel; where ranges overlap the color that comes first wins
+    # @param frame BGR image
+    # @return labels uint8 image, index + 1 of the pixel's color in getColors(), 0 for no color.
+    #         The buffer is reused by the next call
+    def labelImage(self, frame):
+        bits = self.segment(frame)
+        if self.labels is None or self.labels.shape != bits.shape:
+            self.labels = np.empty_like(bits)
+        cv2.LUT(bits, self.labelLut, dst=self.labels)
+        return self.labels
@@ -0,0 +1,41 @@
+'''
+contour_select.py - Picks the k largest blobs of a binary image without
+tracing and sorting every contour.  The area and bounding box of every blob
+come out of one connected components pass as arrays; the few largest are
+picked with a partial sort, and only their outlines are traced, each inside
+its own bounding box and without a contour hierarchy.
+'''
+import numpy as np
+import cv2
+
+
+##
+# @brief finds the k largest blobs of a binary image
+# @param bw single channel image, non zero pixels are foreground
+# @param k number of blobs wanted
+# @param min_area smallest number of pixels of a blob that is considered
+# @param candidates number of blobs (by pixel count) whose outlines are traced to rank them by contour area, default 2*k
+# @return contours up to k outer contours, largest contour area first
+# @return rects (N, 4) array of their bounding rectangles as (x, y, w, h)
+# @return areas (N,) array of their contour areas
+def largestContours(bw, k, min_area=0, candidates=None):
+    if candidates is None:
+        candidates = 2*k
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(bw, connectivity=8)
+    # label 0 is the background
+    pixels = stats[1:, cv2.CC_STAT_AREA]
+    keep = np.flatnonzero(pixels >= min_area)
+    if len(keep) > candidates:
+        keep = keep[np.argpartition(pixels[keep], -candidates)[-candidates:]]
+    contours = []
+    areas = []
+    for index in keep:
+        label = index + 1
+        x, y, w, h = stats[label, :4]
+        blob = (labels[y:y+h, x:x+w] == label).view(np.uint8)
+        outline = cv2.findContours(blob, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(int(x), int(y)))[-2]
+        contours.append(max(outline, key=len))
+        areas.append(cv2.contourArea(contours[-1]))
+    order = np.argsort(areas, kind='stable')[::-1][:k]
+    rects = stats[keep + 1, :4][order].reshape(-1, 4)
+    return [contours[i] for i in order], rects, np.array(areas)[order].reshape(-1)
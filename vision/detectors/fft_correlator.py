@@ -0,0 +1,145 @@
+'''
+fft_correlator.py - Normalized cross correlation (the values of
+cv2.TM_CCORR_NORMED on a zero padded frame, the way detectObject uses it, to
+about 1e-6) for a whole set of templates at once.  The frame is transformed
+once per frame, the template spectra are kept between frames and all
+templates are correlated with a single batched inverse FFT.  Since the
+values are not bit for bit those of matchTemplate, a template that matches a
+flat region (e.g. a big blob of a binary color mask) about equally well
+everywhere can peak at a different point of it than matchTemplate does.
+'''
+import math
+import numpy as np
+import cv2
+
+
+class FFTCorrelator:
+    ##
+    # @param dtype float type the transforms are computed in (np.float32 halves memory and time)
+    def __init__(self, dtype=np.float32):
+        self.dtype = dtype
+        # key -> list of templates
+        self.templates = {}
+        # key -> (S,) sum of squares of each template
+        self.templateNorms = {}
+        # (key, P, Q) -> (S, P, Q/2+1) conjugated template spectra
+        self.spectra = {}
+        # state of the frame set with setFrame
+        self.key = None
+        self.frameShape = None
+        self.fftShape = None
+        self.frameSpectrum = None
+        self.sqsum = None
+
+    ##
+    # @brief registers the set of templates correlated under a key, e.g. the mask slices of a shape
+    # @param key any hashable name for the set
+    # @param templates list of single channel templates
+    def setTemplates(self, key, templates):
+        self.templates[key] = templates
+        self.templateNorms[key] = np.array([np.sum(np.square(t, dtype=np.float64)) for t in templates])
+        for cached in [k for k in self.spectra if k[0] == key]:
+            del self.spectra[cached]
+
+    ##
+    # @brief half sizes used to pad the frame, same as detectObject (ceil of half the template size)
+    # @param key name of the template set
+    # @return halves (S, 2) array of (h1, w1)
+    def halfSizes(self, key):
+        return np.array([(math.ceil(t.shape[0]/2), math.ceil(t.shape[1]/2)) for t in self.templates[key]])
+
+    ##
+    # @brief transforms a frame once so every template of a set can be correlated against it
+    # @param gray_frame_env single channel frame
+    # @param key name of the template set that will be correlated
+    def setFrame(self, gray_frame_env, key):
+        H, W = gray_frame_env.shape[:2]
+        hmax = max(t.shape[0] for t in self.templates[key])
+        wmax = max(t.shape[1] for t in self.templates[key])
+        #big enough that the circular correlation never wraps onto a lag that is read back
+        self.fftShape = (cv2.getOptimalDFTSize(H + hmax), cv2.getOptimalDFTSize(W + wmax))
+        self.frameShape = (H, W)
+        self.key = key
+        self.frameSpectrum = np.fft.rfft2(gray_frame_env.astype(self.dtype), s=self.fftShape)
+        #integral image of the squared frame gives the energy under any template placement
+        s, sqsum = cv2.integral2(gray_frame_env, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        oy, ox = self.halfSizes(key).max(axis=0)
+        #edge padding turns clamped window corners into plain slices
+        self.sqsum = np.pad(sqsum, ((oy, hmax + 1), (ox, wmax + 1)), mode='edge')
+
+    ##
+    # @brief conjugated spectra of a template set for the current FFT size, computed once and kept
+    # @param key name of the template set
+    # @return spectra (S, P, Q/2+1) array
+    def getSpectra(self, key):
+        cacheKey = (key, self.fftShape[0], self.fftShape[1])
+        spectra = self.spectra.get(cacheKey)
+        if spectra is None:
+            spectra = np.stack([np.conj(np.fft.rfft2(t.astype(self.dtype), s=self.fftShape))
+                                for t in self.templates[key]])
+            self.spectra[cacheKey] = spectra
+        return spectra
+
+    ##
+    # @brief normalized correlation of the current frame with every template of the set
+    # @return corr (S, Rh, Rw) volume. corr[s, y, x] equals (to about 1e-6) the cv2.matchTemplate result of template s
+    #         at (x - ox + w1[s], y - oy + h1[s]) where (oy, ox) is the largest half size. Positions
+    #         outside the result of template s are 0
+    # @return offsets (S, 2) array of (oy - h1[s], ox - w1[s]) to subtract from volume indices
+    def correlate(self):
+        key = self.key
+        H, W = self.frameShape
+        P, Q = self.fftShape
+        halves = self.halfSizes(key)
+        oy, ox = halves.max(axis=0)
+        Rh = H + oy + 1
+        Rw = W + ox + 1
+        #one batched inverse transform for every template
+        full = np.fft.irfft2(self.frameSpectrum[np.newaxis] * self.getSpectra(key), s=self.fftShape)
+        #negative lags sit at the end of the circular result, move them in front
+        corr = np.empty((full.shape[0], Rh, Rw), dtype=full.dtype)
+        corr[:, :oy, :ox] = full[:, P - oy:, Q - ox:]
+        corr[:, :oy, ox:] = full[:, P - oy:, :Rw - ox]
+        corr[:, oy:, :ox] = full[:, :Rh - oy, Q - ox:]
+        corr[:, oy:, ox:] = full[:, :Rh - oy, :Rw - ox]
+        sq = self.sqsum
+        for s, t in enumerate(self.templates[key]):
+            h, w = t.shape
+            h1, w1 = halves[s]
+            #only the placements matchTemplate would have produced for this template are normalized
+            y0, y1 = oy - h1, oy + H + h1 - h + 1
+            x0, x1 = ox - w1, ox + W + w1 - w + 1
+            energy = sq[y0 + h:y1 + h, x0 + w:x1 + w] - sq[y0:y1, x0 + w:x1 + w]
+            energy -= sq[y0 + h:y1 + h, x0:x1]
+            energy += sq[y0:y1, x0:x1]
+            energy *= self.templateNorms[key][s]
+            den = np.sqrt(energy, out=energy).astype(self.dtype)
+            #placements over (nearly) empty frame have no meaningful correlation
+            valid = den > 1e-3*(self.templateNorms[key][s] + 1)
+            c = corr[s, y0:y1, x0:x1]
+            np.divide(c, den, out=c, where=valid)
+            c[~valid] = 0
+            np.clip(c, -1, 1, out=c)
+            corr[s, :y0] = 0
+            corr[s, y1:] = 0
+            corr[s, :, :x0] = 0
+            corr[s, :, x1:] = 0
+        offsets = np.column_stack((oy - halves[:, 0], ox - halves[:, 1]))
+        return corr, offsets
+
+    ##
+    # @brief best match of every template of a set in a frame
+    # @param gray_frame_env single channel frame
+    # @param key name of the template set
+    # @return max_val (S,) maximum correlation value of each template
+    # @return max_loc (S, 2) int array of (x, y) locations in cv2.matchTemplate coordinates
+    #         of the zero padded frame, as detectObject uses them. Where the template matches a flat region
+    #         about equally well, rounding decides which point of it this is, not necessarily the one of matchTemplate
+    def peaks(self, gray_frame_env, key):
+        self.setFrame(gray_frame_env, key)
+        corr, offsets = self.correlate()
+        S, Rh, Rw = corr.shape
+        flat = corr.reshape(S, -1).argmax(axis=1)
+        max_val = corr.reshape(S, -1)[np.arange(S), flat]
+        max_loc = np.column_stack((flat % Rw - offsets[:, 1], flat // Rw - offsets[:, 0]))
+        return max_val, max_loc
@@ -0,0 +1,63 @@
+'''
+integral_image.py - Summed-area table of a frame.  Built once per frame with
+one pass, after which the sum or mean color of any rectangle costs four
+lookups no matter how large the rectangle is, so many ROI color checks per
+frame are nearly free.
+'''
+import numpy as np
+import cv2
+
+
+class IntegralImage:
+    def __init__(self):
+        # (rows + 1, cols + 1, channels) float64 table, reused while the frame size stays the same
+        self.table = None
+        self.channels = 0
+
+    ##
+    # @brief builds the summed-area table of a frame
+    # @param frame image (single or multi channel) whose regions will be queried
+    def setFrame(self, frame):
+        self.channels = frame.shape[2] if frame.ndim == 3 else 1
+        shape = (frame.shape[0] + 1, frame.shape[1] + 1) + ((self.channels,) if self.channels > 1 else ())
+        if self.table is None or self.table.shape != shape:
+            self.table = np.empty(shape, dtype=np.float64)
+        cv2.integral(frame, sum=self.table, sdepth=cv2.CV_64F)
+
+    ##
+    # @return rows, cols of the frame the table was built from
+    def getFrameShape(self):
+        return self.table.shape[0] - 1, self.table.shape[1] - 1
+
+    ##
+    # @brief sums of several rectangles at once. Rectangles are clipped to the frame
+    # @param rects (N, 4) array of rectangles as (x, y, w, h)
+    # @return sums (N, channels) float64 array of the pixel sums
+    # @return areas (N,) array with the number of pixels of each clipped rectangle
+    def sums(self, rects):
+        rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        rows, cols = self.getFrameShape()
+        x0 = np.clip(rects[:, 0], 0, cols)
+        y0 = np.clip(rects[:, 1], 0, rows)
+        x1 = np.clip(rects[:, 0] + rects[:, 2], 0, cols)
+        y1 = np.clip(rects[:, 1] + rects[:, 3], 0, rows)
+        table = self.table.reshape(rows + 1, cols + 1, self.channels)
+        sums = table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+        areas = np.maximum(x1 - x0, 0)*np.maximum(y1 - y0, 0)
+        return sums, areas
+
+    ##
+    # @brief mean color of several rectangles at once
+    # @param rects (N, 4) array of rectangles as (x, y, w, h)
+    # @return means (N, channels) float64 array, 0 for rectangles entirely outside the frame
+    def means(self, rects):
+        sums, areas = self.sums(rects)
+        return np.divide(sums, areas[:, None], out=np.zeros_like(sums), where=areas[:, None] > 0)
+
+    ##
+    # @brief mean color of a single rectangle
+    # @param x, y upper left corner of the rectangle
+    # @param w, h size of the rectangle
+    # @return mean (channels,) float64 array, same order as the frame's channels (B, G, R for color frames)
+    def mean(self, x, y, w, h):
+        return self.means([(x, y, w, h)])[0]
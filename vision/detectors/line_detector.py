@@ -0,0 +1,105 @@
+'''
+line_detector.py - Orange path line detection for the downward camera, the
+same steps as VisionTools.lineDet fused into as few full frame passes as
+possible.  Only the median blur, the bright pixel threshold and the contour
+search touch the whole frame; the red line filter runs on the bounding box
+of the largest bright contour only.  All images are kept in buffers that are
+reused from frame to frame, and the result is the line's midline and heading
+instead of a decorated image.
+'''
+import numpy as np
+import cv2
+from .line_geometry import maskMidline, fitLine
+
+
+class LineDetector:
+    ##
+    # @param bright value a channel has to exceed for a pixel to be part of a bright contour (lineDet's threshold)
+    # @param min_red smallest red value of a line pixel
+    def __init__(self, bright=153, min_red=10):
+        self.bright = bright
+        self.min_red = min_red
+        # full frame buffers, reallocated only when the frame size changes
+        self.blur = None
+        self.channelMax = None
+        self.bw = None
+        self.mask = None
+        # bounding box of the largest contour in the last frame, (x, y, w, h)
+        self.rect = None
+
+    ##
+    # @brief makes the full frame buffers for a frame size
+    # @param shape shape of the BGR frames
+    def allocate(self, shape):
+        self.blur = np.empty(shape, dtype=np.uint8)
+        self.channelMax = np.empty(shape[:2], dtype=np.uint8)
+        self.bw = np.empty(shape[:2], dtype=np.uint8)
+        self.mask = np.zeros(shape[:2], dtype=np.uint8)
+        # ROI sized scratch for the larger of green and blue
+        self.otherMax = np.empty(shape[:2], dtype=np.uint8)
+        self.rect = None
+
+    ##
+    # @brief finds the line in a frame
+    # @param frame BGR frame from the downward camera
+    # @return line (angle, offset) of the line, see line_geometry.fitLine. None if no line was found
+    # @return points (M, 2) array of (x, y) midline points in frame coordinates
+    # @return rect (x, y, w, h) bounding box of the largest bright contour, None if there is none
+    def detect(self, frame):
+        if self.blur is None or self.blur.shape != frame.shape:
+            self.allocate(frame.shape)
+        cv2.medianBlur(frame, 5, dst=self.blur)
+        # a pixel belongs to a bright contour when any of its channels is above the threshold
+        np.maximum(self.blur[:, :, 0], self.blur[:, :, 1], out=self.channelMax)
+        np.maximum(self.channelMax, self.blur[:, :, 2], out=self.channelMax)
+        cv2.threshold(self.channelMax, self.bright, 255, cv2.THRESH_BINARY, dst=self.bw)
+        # only the outer outline of each blob is needed to pick the largest one
+        contours = cv2.findContours(self.bw, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+        # clear what the last frame left in the mask
+        if self.rect is not None:
+            x, y, w, h = self.rect
+            self.mask[y:y+h, x:x+w] = 0
+            self.rect = None
+        if len(contours) == 0:
+            return None, np.zeros((0, 2), dtype=int), None
+
+        x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+        self.rect = (x, y, w, h)
+        # red line pixels: red is the largest channel (lineDet's max RGB filter) and at least min_red
+        roi = self.blur[y:y+h, x:x+w]
+        other = self.otherMax[y:y+h, x:x+w]
+        mask = self.mask[y:y+h, x:x+w]
+        np.maximum(roi[:, :, 0], roi[:, :, 1], out=other)
+        np.maximum(other, max(self.min_red - 1, 0), out=other)
+        np.greater(roi[:, :, 2], other, out=mask.view(bool))
+        # booleans are 0/1, make the mask 0/255 like inRange
+        np.multiply(mask, 255, out=mask)
+
+        # the midline runs along the longer side of the box
+        points = maskMidline(mask, axis=1 if h > w else 0)
+        points += (x, y)
+        return fitLine(points, frame.shape), points, self.rect
+
+    ##
+    # @return mask uint8 mask of the line pixels of the last frame (255 on the line). The buffer is reused by the next frame
+    def getMask(self):
+        return self.mask
+
+    ##
+    # @return coordList (N, 2) array of (row, column) coordinates of the line pixels, like LinePosition
+    def getCoordinates(self):
+        if self.rect is None:
+            return np.zeros((0, 2), dtype=int)
+        x, y, w, h = self.rect
+        return np.argwhere(self.mask[y:y+h, x:x+w]) + (y, x)
+
+    ##
+    # @brief image of the line as lineDet returns it: the red channel of the line pixels on a black background
+    # @return output new BGR image
+    def render(self):
+        output = np.zeros_like(self.blur)
+        if self.rect is not None:
+            x, y, w, h = self.rect
+            np.bitwise_and(self.blur[y:y+h, x:x+w, 2], self.mask[y:y+h, x:x+w], out=output[y:y+h, x:x+w, 2])
+        return output
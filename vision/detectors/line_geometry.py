@@ -0,0 +1,82 @@
+'''
+line_geometry.py - Midline of a path marker and the straight line through
+it.  The midline is the middle column of the marker's pixels in each image
+row (the middle row in each column for a marker lying across the image),
+found with a single vectorized reduction instead of one scan of the pixel
+list per row, and the fitted line is reduced to a heading and an
+offset from the image center that the controllers can steer on.
+'''
+import math
+import numpy as np
+import cv2
+
+
+##
+# @brief midline from the pixel coordinates returned by LinePosition
+# @param coordList (N, 2 or 3) array of (row, column[, channel]) pixel coordinates
+# @param axis 1 takes the middle column of every row (for lines running up the image), 0 the middle row of every
+#        column (for lines running across it), as in maskMidline. None picks 1 unless the pixels are wider than tall
+# @return points (M, 2) int array of (x, y) midline points, one per row (top to bottom) or column (left to right)
+def midlinePoints(coordList, axis=None):
+    coordList = np.asarray(coordList)
+    if len(coordList) == 0:
+        return np.zeros((0, 2), dtype=int)
+    rows = coordList[:, 0]
+    cols = coordList[:, 1]
+    if axis is None:
+        axis = 0 if np.ptp(cols) > np.ptp(rows) else 1
+    # group by the coordinate along the line, reduce the one across it
+    along, across = (rows, cols) if axis == 1 else (cols, rows)
+    order = np.argsort(along, kind='stable')
+    along = along[order]
+    across = across[order]
+    # every group starts a segment of the sorted list, reduce each segment at once
+    keys, starts = np.unique(along, return_index=True)
+    low = np.minimum.reduceat(across, starts)
+    high = np.maximum.reduceat(across, starts)
+    mid = (low + high)//2
+    if axis == 1:
+        return np.column_stack((mid, keys)).astype(int)
+    return np.column_stack((keys, mid)).astype(int)
+
+
+##
+# @brief midline straight from a binary mask of the line, without building a pixel list
+# @param mask single channel image, non zero on the line
+# @param axis 0 takes the middle row of every column (for lines running across the image),
+#        1 the middle column of every row (for lines running up the image), same as midlinePoints
+# @return points (M, 2) int array of (x, y) midline points, one per column (left to right) or row (top to bottom)
+def maskMidline(mask, axis=0):
+    on = mask > 0
+    if axis == 1:
+        on = on.T
+    covered = on.any(axis=0)
+    index = np.flatnonzero(covered)
+    on = on[:, index]
+    first = np.argmax(on, axis=0)
+    last = on.shape[0] - 1 - np.argmax(on[::-1], axis=0)
+    mid = (first + last)//2
+    if axis == 1:
+        return np.column_stack((mid, index)).astype(int)
+    return np.column_stack((index, mid)).astype(int)
+
+
+##
+# @brief fits a straight line through the midline points
+# @param points (M, 2) array of (x, y) points
+# @param frame_shape shape of the image the points come from, the offset is measured from its center
+# @return line (angle, offset): angle in degrees between the line and the image's vertical axis, positive when the
+#         top of the line leans right, and the signed distance in pixels from the image center to the line,
+#         positive when the line is right of the center. None with fewer than 2 points
+def fitLine(points, frame_shape):
+    if len(points) < 2:
+        return None
+    vx, vy, x0, y0 = cv2.fitLine(np.asarray(points, dtype=np.float32), cv2.DIST_L2, 0, 0.01, 0.01).ravel()
+    # point the direction up the image
+    if vy > 0 or (vy == 0 and vx < 0):
+        vx, vy = -vx, -vy
+    angle = math.degrees(math.atan2(vx, -vy))
+    cy, cx = (frame_shape[0] - 1)/2, (frame_shape[1] - 1)/2
+    # right hand normal of the upward direction
+    offset = (x0 - cx)*(-vy) + (y0 - cy)*vx
+    return angle, float(offset)
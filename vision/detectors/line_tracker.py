@@ -0,0 +1,157 @@
+'''
+line_tracker.py - Follows the path line from frame to frame.  The line
+found in the previous frames predicts where it will be next; only a band
+around that prediction is blurred and filtered, and the full frame search
+of LineDetector is only run again when the line is lost.  The output is a
+compact line model (angle, offset, confidence) rather than pixel lists.
+'''
+import math
+import numpy as np
+import cv2
+from .line_detector import LineDetector
+from .line_geometry import maskMidline, fitLine
+
+
+class LineTracker:
+    ##
+    # @param detector LineDetector used for the full frame search, a new one if None
+    # @param band room (pixels) left on each side of the line in the predicted band, on top of half the line width
+    # @param min_confidence fraction of the band length the line has to cover to count as found
+    def __init__(self, detector=None, band=20, min_confidence=0.3):
+        self.detector = LineDetector() if detector is None else detector
+        self.band = band
+        self.min_confidence = min_confidence
+        self.reset()
+        # flat scratch buffers, frame sized, viewed as contiguous ROI sized images
+        self.scratch = None
+        self.bandMask = None
+
+    ##
+    # @brief forgets the line, the next update searches the whole frame
+    def reset(self):
+        # (angle, offset) of the last fit and its change per frame
+        self.line = None
+        self.velocity = (0.0, 0.0)
+        # width of the line in pixels, measured on the last fit
+        self.width = 0.0
+        self.confidence = 0.0
+        # 'search' when the last update ran the full frame search, 'track' when it only looked at the band
+        self.mode = 'search'
+
+    ##
+    # @return the line expected in the next frame, (angle, offset), None if there is no line to follow
+    def predict(self):
+        if self.line is None:
+            return None
+        return self.line[0] + self.velocity[0], self.line[1] + self.velocity[1]
+
+    ##
+    # @brief finds the line in the next frame
+    # @param frame BGR frame from the downward camera
+    # @return line (angle, offset, confidence): angle and offset as in line_geometry.fitLine and the fraction
+    #         of the searched length the line covers. None if the line was not found
+    def update(self, frame):
+        predicted = self.predict()
+        found = None
+        if predicted is not None:
+            self.mode = 'track'
+            found = self.trackBand(frame, predicted)
+        if found is None:
+            self.mode = 'search'
+            found = self.search(frame)
+        if found is None:
+            self.reset()
+            return None
+        line, confidence, width = found
+        # no velocity across a search, or when the angle wrapped around +-90 degrees
+        if self.line is not None and self.mode == 'track' and abs(line[0] - self.line[0]) < 45:
+            self.velocity = (line[0] - self.line[0], line[1] - self.line[1])
+        else:
+            self.velocity = (0.0, 0.0)
+        self.line = line
+        self.confidence = confidence
+        self.width = width
+        return line[0], line[1], confidence
+
+    ##
+    # @brief full frame search with the line detector
+    # @return (angle, offset), confidence, width of the line, None if no line was found
+    def search(self, frame):
+        line, points, rect = self.detector.detect(frame)
+        if line is None:
+            return None
+        confidence = len(points)/max(rect[2], rect[3])
+        if confidence < self.min_confidence:
+            return None
+        x, y, w, h = rect
+        width = cv2.countNonZero(self.detector.getMask()[y:y+h, x:x+w])/len(points)
+        return line, confidence, width
+
+    ##
+    # @brief looks for the line only in a band around its predicted position
+    # @param predicted (angle, offset) of the predicted line
+    # @return (angle, offset), confidence, width of the line, None if the line is not in the band
+    def trackBand(self, frame, predicted):
+        H, W = frame.shape[:2]
+        if self.scratch is None or self.bandMask.shape != (H, W):
+            self.scratch = np.empty(H*W*3, dtype=np.uint8)
+            self.maskScratch = np.empty(H*W, dtype=np.uint8)
+            self.otherScratch = np.empty(H*W, dtype=np.uint8)
+            self.bandMask = np.zeros((H, W), dtype=np.uint8)
+            self.bandRect = None
+        corners = self.bandCorners(predicted, (H, W), self.width/2 + self.band)
+        # rasterize the band into the mask and take its bounding box, clamped to the frame
+        if self.bandRect is not None:
+            x, y, w, h = self.bandRect
+            self.bandMask[y:y+h, x:x+w] = 0
+        cv2.fillConvexPoly(self.bandMask, corners, 255)
+        x, y, w, h = cv2.boundingRect(corners)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, W), min(y + h, H)
+        self.bandRect = (x0, y0, max(x1 - x0, 0), max(y1 - y0, 0))
+        if x1 - x0 < 5 or y1 - y0 < 5:
+            return None
+        x, y, w, h = self.bandRect
+        # contiguous ROI sized views of the scratch buffers
+        blur = self.scratch[:h*w*3].reshape(h, w, 3)
+        mask = self.maskScratch[:h*w].reshape(h, w)
+        other = self.otherScratch[:h*w].reshape(h, w)
+        cv2.medianBlur(frame[y:y+h, x:x+w], 5, dst=blur)
+        # red line pixels, the same test as LineDetector, inside the band
+        np.maximum(blur[:, :, 0], blur[:, :, 1], out=other)
+        np.maximum(other, max(self.detector.min_red - 1, 0), out=other)
+        np.greater(blur[:, :, 2], other, out=mask.view(bool))
+        np.multiply(mask, 255, out=mask)
+        cv2.bitwise_and(mask, self.bandMask[y:y+h, x:x+w], dst=mask)
+
+        axis = 1 if h > w else 0
+        points = maskMidline(mask, axis)
+        confidence = len(points)/(h if axis == 1 else w)
+        if confidence < self.min_confidence:
+            return None
+        width = cv2.countNonZero(mask)/len(points)
+        points += (x, y)
+        return fitLine(points, frame.shape), confidence, width
+
+    ##
+    # @brief corners of a band along a line, long enough to cross the whole frame
+    # @param line (angle, offset) of the line, see line_geometry.fitLine
+    # @param shape (rows, cols) of the frame
+    # @param half_width distance from the line to each side of the band
+    # @return corners (4, 2) int32 array of the band's corners
+    def bandCorners(self, line, shape, half_width):
+        angle, offset = line
+        a = math.radians(angle)
+        # upward direction and its right hand normal, as in fitLine
+        d = np.array([math.sin(a), -math.cos(a)])
+        n = np.array([math.cos(a), math.sin(a)])
+        c = np.array([(shape[1] - 1)/2, (shape[0] - 1)/2])
+        p = c + offset*n
+        length = math.hypot(shape[0], shape[1])
+        corners = [p + s*length*d + t*half_width*n for s, t in ((-1, -1), (1, -1), (1, 1), (-1, 1))]
+        return np.round(corners).astype(np.int32)
+
+    ##
+    # @return 'track' if the last update only searched the predicted band, 'search' if it searched the whole frame
+    def getMode(self):
+        return self.mode
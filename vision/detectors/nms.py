@@ -0,0 +1,43 @@
+'''
+nms.py - Non-maximum suppression of detections made at several scales.
+Boxes are visited from the highest score down; each kept box removes every
+remaining box that overlaps it by more than the allowed amount, computed for
+all of them at once.  Since the boxes come from masks of different sizes and
+a small box inside a big one barely overlaps it, the boxes are also
+suppressed by where their centers are.
+'''
+import numpy as np
+
+
+##
+# @brief greedy non-maximum suppression of detections made at several scales
+# @param boxes (N, 4) array of boxes as (xA, yA, xB, yB)
+# @param scores (N,) array with the score of each box, higher is better
+# @param overlapThresh largest intersection over union a kept box may have with a better one of the same size
+# @return pick indices of the kept boxes, best score first. A box is also dropped when its center is within half
+#         the size of the larger of the two boxes from the center of a better box, which covers every box centered
+#         inside a better one
+def crossScaleSuppression(boxes, scores, overlapThresh=0.3):
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=int)
+    boxes = np.asarray(boxes, dtype=np.float64)
+    xA, yA, xB, yB = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    cx, cy = (xA + xB)/2, (yA + yB)/2
+    bw, bh = xB - xA, yB - yA
+    area = (bw + 1)*(bh + 1)
+    order = np.argsort(scores, kind='stable')[::-1]
+    pick = []
+    while order.size > 0:
+        i = order[0]
+        pick.append(i)
+        rest = order[1:]
+        #overlap of the kept box with every box that is still a candidate
+        w = np.maximum(0, np.minimum(xB[i], xB[rest]) - np.maximum(xA[i], xA[rest]) + 1)
+        h = np.maximum(0, np.minimum(yB[i], yB[rest]) - np.maximum(yA[i], yA[rest]) + 1)
+        inter = w*h
+        iou = inter/(area[i] + area[rest] - inter)
+        #centers closer than half the larger box in both directions belong to the same object
+        near = ((np.abs(cx[rest] - cx[i]) <= np.maximum(bw[i], bw[rest])/2) &
+                (np.abs(cy[rest] - cy[i]) <= np.maximum(bh[i], bh[rest])/2))
+        order = rest[(iou <= overlapThresh) & ~near]
+    return np.array(pick, dtype=int)
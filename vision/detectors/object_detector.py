@@ -0,0 +1,293 @@
+'''
+object_detector.py - Shape detection by normalized correlation with dynamic
+environment selection (the detectObject algorithm developed by Jake Harmon),
+kept as an object so it can be reused frame after frame.  Every buffer the
+search needs is allocated once for a fixed frame resolution and the matching
+writes into those buffers instead of returning new arrays.
+'''
+import math
+import numpy as np
+import cv2
+from .nms import crossScaleSuppression
+
+
+class ObjectDetector:
+    # per mask slice results of the last call to detect
+    resultType = np.dtype([('max_val', np.float64),
+                           ('loc_x', np.int32),
+                           ('loc_y', np.int32),
+                           ('obj_w', np.int32),
+                           ('obj_h', np.int32),
+                           ('k', np.int32)])
+
+    ##
+    # @param templateBank TemplateBank the mask slices are taken from
+    # @param userMask The shape the detector looks for
+    # @param frame_shape (rows, cols) of the single channel frames that will be passed in
+    # @param div number of slices in the size of the mask
+    # @param size_range maximum scaling of the mask based on the original size
+    # @param fftCorrelator optional FFTCorrelator used for the full frame scan when detect is called with use_fft
+    def __init__(self, templateBank, userMask, frame_shape, div=20, size_range=200, fftCorrelator=None):
+        self.templateBank = templateBank
+        self.userMask = userMask
+        self.div = div
+        self.size_range = size_range
+        self.fftCorrelator = fftCorrelator
+        self.match_type = cv2.TM_CCORR_NORMED
+        self.frame_shape = (frame_shape[0], frame_shape[1])
+        H, W = self.frame_shape
+
+        templateBank.precompute(userMask, div, size_range)
+        #unrefined slices, from div/size_range (minimum size) to div*div/size_range (maximum size)
+        self.slices = [templateBank.getSlice(userMask, i, 0, div, size_range) for i in range(div-1)]
+        self.length = len(self.slices)
+        self.results = np.zeros(self.length, dtype=self.resultType)
+
+        #one zero bordered frame wide enough for every slice; each slice matches against a view of it
+        halves = [(math.ceil(b.shape[0]/2), math.ceil(b.shape[1]/2)) for b in self.slices]
+        self.pad_y = max(h1 for h1, w1 in halves)
+        self.pad_x = max(w1 for h1, w1 in halves)
+        self.halves = halves
+        self.padded = np.zeros((H + 2*self.pad_y, W + 2*self.pad_x), np.uint8)
+        #a correlation map is never bigger than the frame plus one pixel of border on each side
+        self.corr = np.empty((H + 2, W + 2), np.float32)
+        #buffers used by detectAll to find every local maximum of a correlation map
+        self.corrMax = np.empty((H + 2, W + 2), np.float32)
+        self.peaks = np.empty((H + 2, W + 2), bool)
+        self.above = np.empty((H + 2, W + 2), bool)
+        #a peak has to be the maximum over half the size of its slice
+        self.peakKernels = [np.ones((max(3, min(b.shape)//2 | 1),)*2, np.uint8) for b in self.slices]
+
+        #the refinement windows are at most twice the biggest refined slice, plus its zero border
+        biggest = templateBank.getSlice(userMask, self.length - 1, templateBank.maxStep(div, size_range) + 1,
+                                        div, size_range)
+        wh = min(2*biggest.shape[0], H) + 2*math.ceil(biggest.shape[0]/2)
+        ww = min(2*biggest.shape[1], W) + 2*math.ceil(biggest.shape[1]/2)
+        self.window = np.zeros((wh, ww), np.uint8)
+        self.windowCorr = np.empty((wh, ww), np.float32)
+
+    ##
+    # @brief correlates a slice of the mask with the zero bordered window of the frame around a location
+    # @param gray_frame_env frame being searched
+    # @param b mask slice
+    # @param loc (x,y) location the window is centered on
+    # @return max_val_new maximum correlation inside the window
+    # @return max_loc_new (x,y) location of the maximum, relative to the window
+    # @return x1 X offset of the window in the frame
+    # @return y2 Y offset of the window in the frame
+    def matchWindow(self, gray_frame_env, b, loc):
+        lb = gray_frame_env.shape
+        mn = b.shape
+        #MN is a tuple for the size of the matrix as MxN
+        h1 = math.ceil(mn[0]/2)
+        w1 = math.ceil(mn[1]/2)
+        #checking to see if the dyn env caused impossible pixels to be selected (negative or beyond max dim)
+        y1 = min(loc[1] + mn[0], lb[0])
+        y2 = max(loc[1] - mn[0], 0)
+        x1 = max(loc[0] - mn[1], 0)
+        x2 = min(loc[0] + mn[1], lb[1])
+        #select the section from the whole env and give it a zero border, written into the window buffer
+        section = gray_frame_env[y2:y1, x1:x2]
+        envir = self.window[:section.shape[0] + 2*h1, :section.shape[1] + 2*w1]
+        cv2.copyMakeBorder(section, h1, h1, w1, w1, cv2.BORDER_CONSTANT, dst=envir, value=0)
+        corrnew = self.windowCorr[:envir.shape[0] - mn[0] + 1, :envir.shape[1] - mn[1] + 1]
+        cv2.matchTemplate(envir, b, self.match_type, result=corrnew)
+        min_val_new, max_val_new, min_loc_new, max_loc_new = cv2.minMaxLoc(corrnew)
+        return max_val_new, max_loc_new, x1, y2
+
+    ##
+    # @brief copies a frame into the zero bordered buffer and blanks the excluded rectangles
+    # @param gray_frame_env single channel frame, no bigger than the resolution given at construction
+    # @param exclusions list of (x, y, w, h) rectangles, relative to gray_frame_env, that must not be matched
+    # @return frame view of the buffer holding the masked copy of the frame
+    def loadFrame(self, gray_frame_env, exclusions=()):
+        H, W = gray_frame_env.shape[:2]
+        py, px = self.pad_y, self.pad_x
+        frame = self.padded[py:py + H, px:px + W]
+        np.copyto(frame, gray_frame_env)
+        #a frame smaller than the buffer leaves old pixels to its right and below, which must read as border
+        if H < self.frame_shape[0]:
+            self.padded[py + H:py + H + py, px:px + W + px] = 0
+        if W < self.frame_shape[1]:
+            self.padded[py:py + H + py, px + W:px + W + px] = 0
+        for (x, y, w, h) in exclusions:
+            frame[max(y, 0):max(y + h, 0), max(x, 0):max(x + w, 0)] = 0
+        return frame
+
+    ##
+    # @brief correlates an unrefined mask slice with the whole frame loaded in the buffer
+    # @param index index of the slice
+    # @param H rows of the loaded frame
+    # @param W columns of the loaded frame
+    # @return corr view of the correlation buffer holding the result, (x,y) of a value is the slice center
+    def matchSlice(self, index, H, W):
+        b = self.slices[index]
+        py, px = self.pad_y, self.pad_x
+        #append a border of zero around environment (half of mask size in corresponding direction)
+        h1, w1 = self.halves[index]
+        envir = self.padded[py - h1:py + H + h1, px - w1:px + W + w1]
+        corr = self.corr[:H + 2*h1 - b.shape[0] + 1, :W + 2*w1 - b.shape[1] + 1]
+        cv2.matchTemplate(envir, b, self.match_type, result=corr)
+        return corr
+
+    ##
+    # @brief finds the best match of every mask slice in a frame
+    # @param gray_frame_env single channel frame, no bigger than the resolution given at construction
+    # @param threshold detection tolerance (ex. threshold = 0.95 --> 95 percent match)
+    # @param use_fft if True, the full frame scan of all slices is one batched FFT (needs fftCorrelator). Its values
+    #        match matchTemplate to about 1e-6, but on flat regions of the frame a slice's peak can land on a
+    #        different, equally good location, so the results are close to those of the default scan, not the same
+    # @param exclusions list of (x, y, w, h) rectangles that are blanked before matching
+    # @return results structured array (one entry per slice) with max_val, loc_x, loc_y (center),
+    #         obj_w, obj_h (size of the best mask) and k (refinement step reached).
+    #         The array is reused by the next call
+    # @return detect True if a refined slice matched above threshold
+    def detect(self, gray_frame_env, threshold, use_fft=False, exclusions=()):
+        bank = self.templateBank
+        userMask = self.userMask
+        div = self.div
+        size_range = self.size_range
+        results = self.results
+        detect = False
+        #from here on the search only looks at the (masked) copy in the buffer
+        gray_frame_env = self.loadFrame(gray_frame_env, exclusions)
+        H, W = gray_frame_env.shape
+
+        if use_fft:
+            #transform the frame once and correlate it with every slice at the same time
+            key = (userMask, div, size_range)
+            if key not in self.fftCorrelator.templates:
+                self.fftCorrelator.setTemplates(key, self.slices)
+            fft_val, fft_loc = self.fftCorrelator.peaks(gray_frame_env, key)
+
+        for index in range(self.length):
+            b = self.slices[index]
+            if use_fft:
+                max_val = float(fft_val[index])
+                max_loc = (int(fft_loc[index][0]), int(fft_loc[index][1]))
+            else:
+                corr = self.matchSlice(index, H, W)
+                #IMportant: max_loc is in the form of (x,y) tuple, i.e. col then row
+                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(corr)
+            #save size of obj in (x,y) form, save intermediate locations (need this to save changes made by dyn env later)
+            final_obj = b.shape[::-1]
+            intem_loc = max_loc
+            intem_x1 = 0
+            intem_y2 = 0
+            k = 1
+            #resize mask slice by .2% of original mask size
+            b = bank.getSlice(userMask, index, k, div, size_range)
+            max_val_new, max_loc_new, x1, y2 = self.matchWindow(gray_frame_env, b, max_loc)
+            #While loop: trailing stop of 10% (i.e. if current cor falls below 90% of max, exit loop)
+            #k < 10 establishes a min for iterations, as a trend might not appear until a certain increase
+            #max_val > .25 dictates that if the max corr is still below 1/4 by the tenth iteration to exit loop
+            while ((max_val_new > (0.9*max_val) or (k < 10)) and (k < 10 or max_val > 0.25)):
+                #if statement to check when one mask slice reaches the very start of the next slice
+                if (k > (div/size_range)/bank.step):
+                    break
+                if (max_val_new > max_val):
+                    final_obj = b.shape[::-1]
+                    max_val = max_val_new
+                    intem_loc = max_loc_new
+                    intem_x1 = x1
+                    intem_y2 = y2
+                    k = k + 1
+                if (max_val_new > threshold):
+                    detect = True
+                if (max_val_new < threshold):
+                    b = bank.getSlice(userMask, index, k, div, size_range)
+                    max_val_new, max_loc_new, x1, y2 = self.matchWindow(gray_frame_env, b, max_loc)
+                    if (max_val_new > max_val):
+                        final_obj = b.shape[::-1]
+                        intem_loc = max_loc_new
+                        intem_x1 = x1
+                        intem_y2 = y2
+                break
+            #loc_x,loc_y save the adjusted values of the location relative to the original environment
+            result = results[index]
+            result['max_val'] = max_val
+            result['loc_x'] = intem_loc[0] + intem_x1
+            result['loc_y'] = intem_loc[1] + intem_y2
+            result['obj_w'] = final_obj[0]
+            result['obj_h'] = final_obj[1]
+            result['k'] = k
+
+        return results, detect
+
+    ##
+    # @brief searches only inside a list of windows of the frame, skipping excluded rectangles
+    # @param gray_frame_env single channel frame with the resolution given at construction
+    # @param threshold detection tolerance (ex. threshold = 0.95 --> 95 percent match)
+    # @param windows list of (x, y, w, h) search windows in frame coordinates, clamped to the frame
+    # @param exclusions list of (x, y, w, h) rectangles in frame coordinates that must not be matched
+    # @return results structured array of shape (number of windows, number of slices), locations in frame coordinates
+    # @return found -vector- True for each window where a refined slice matched above threshold
+    def detectWindows(self, gray_frame_env, threshold, windows, exclusions=()):
+        H, W = gray_frame_env.shape[:2]
+        results = np.zeros((len(windows), self.length), dtype=self.resultType)
+        found = np.zeros(len(windows), dtype=bool)
+        for i, (x, y, w, h) in enumerate(windows):
+            x0, y0 = max(int(x), 0), max(int(y), 0)
+            x1, y1 = min(int(x + w), W), min(int(y + h), H)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            #exclusions are moved into window coordinates; the ones that miss it cost nothing
+            local = [(ex - x0, ey - y0, ew, eh) for (ex, ey, ew, eh) in exclusions
+                     if ex < x1 and ex + ew > x0 and ey < y1 and ey + eh > y0]
+            window_results, found[i] = self.detect(gray_frame_env[y0:y1, x0:x1], threshold, exclusions=local)
+            results[i] = window_results
+            results[i]['loc_x'] += x0
+            results[i]['loc_y'] += y0
+        return results, found
+
+    ##
+    # @brief finds every object in one pass: all correlation peaks above threshold of every slice, with overlapping ones suppressed
+    # @param gray_frame_env single channel frame, no bigger than the resolution given at construction
+    # @param threshold detection tolerance (ex. threshold = 0.95 --> 95 percent match)
+    # @param overlapThresh largest intersection over union two reported objects of the same size may have
+    # @param max_per_scale most peaks kept from a single slice before suppression
+    # @param exclusions list of (x, y, w, h) rectangles that are blanked before matching
+    # @return detections (N, 4) array of (x, y, scale, score) rows, best score first. (x, y) is the
+    #         object center and scale the size of the matching slice relative to the full size mask
+    def detectAll(self, gray_frame_env, threshold, overlapThresh=0.3, max_per_scale=50, exclusions=()):
+        gray_frame_env = self.loadFrame(gray_frame_env, exclusions)
+        H, W = gray_frame_env.shape
+        found = []
+        for index in range(self.length):
+            corr = self.matchSlice(index, H, W)
+            rh, rw = corr.shape
+            #a peak is a value that is the maximum of its neighbourhood and above threshold
+            corrMax = self.corrMax[:rh, :rw]
+            peaks = self.peaks[:rh, :rw]
+            above = self.above[:rh, :rw]
+            cv2.dilate(corr, self.peakKernels[index], dst=corrMax)
+            np.greater_equal(corr, corrMax, out=peaks)
+            np.greater_equal(corr, threshold, out=above)
+            np.logical_and(peaks, above, out=peaks)
+            ys, xs = np.nonzero(peaks)
+            if len(xs) == 0:
+                continue
+            #a flat plateau passes the peak test at every pixel: keep one pixel, its center, per connected plateau
+            count, labels, stats, centroids = cv2.connectedComponentsWithStats(peaks.view(np.uint8), connectivity=8)
+            if count - 1 < len(xs):
+                label = labels[ys, xs]
+                dist = (xs - centroids[label, 0])**2 + (ys - centroids[label, 1])**2
+                order = np.lexsort((dist, label))
+                first = order[np.r_[True, label[order][1:] != label[order][:-1]]]
+                ys, xs = ys[first], xs[first]
+            scores = corr[ys, xs]
+            if len(scores) > max_per_scale:
+                top = np.argpartition(scores, -max_per_scale)[-max_per_scale:]
+                ys, xs, scores = ys[top], xs[top], scores[top]
+            h, w = self.slices[index].shape
+            scale = self.templateBank.sliceScale(index, 0, self.div, self.size_range)
+            found.append(np.column_stack((xs, ys, np.full(len(xs), w), np.full(len(xs), h),
+                                          np.full(len(xs), scale), scores)))
+        if not found:
+            return np.zeros((0, 4))
+        found = np.concatenate(found)
+        x, y, w, h = found[:, 0], found[:, 1], found[:, 2], found[:, 3]
+        boxes = np.column_stack((x - w/2, y - h/2, x + w/2, y + h/2))
+        #slices of every size are compared, so a small slice matching inside a big object is dropped as well
+        pick = crossScaleSuppression(boxes, found[:, 5], overlapThresh)
+        return found[pick][:, [0, 1, 4, 5]]
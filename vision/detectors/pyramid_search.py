@@ -0,0 +1,135 @@
+'''
+pyramid_search.py - Coarse-to-fine version of the detectObject search.  The
+frame and the mask slices are downsampled, candidate peaks are found on the
+small images and only a small window around each candidate is correlated at
+full resolution.
+'''
+import math
+import cv2
+
+
+class PyramidSearch:
+    ##
+    # @param templateBank TemplateBank the mask slices are taken from
+    # @param levels number of times the frame is halved for the coarse search
+    # @param min_size smallest side (in pixels) a mask slice may have at the coarse level.
+    #        Slices that would get smaller than this are searched on a finer level
+    # @param margin half size (in full resolution pixels) of the refinement window per pyramid level
+    # @param candidates number of coarse peaks refined per mask slice
+    # @param refine_steps number of .2% growth steps of the mask tried around each candidate
+    def __init__(self, templateBank, levels=2, min_size=8, margin=2, candidates=1, refine_steps=2):
+        self.templateBank = templateBank
+        self.levels = levels
+        self.min_size = min_size
+        self.margin = margin
+        self.candidates = candidates
+        self.refine_steps = refine_steps
+        self.match_type = cv2.TM_CCORR_NORMED
+        # (shape, scale, level) -> downsampled mask slice
+        self.coarseTemplates = {}
+
+    ##
+    # @brief downsampled version of a mask slice, made once and kept
+    # @param shape name of the shape
+    # @param scale scale of the slice in the template bank
+    # @param level pyramid level the slice is needed at
+    # @return template mask slice at the given pyramid level
+    def getCoarseTemplate(self, shape, scale, level):
+        key = (shape, round(scale, 9), level)
+        template = self.coarseTemplates.get(key)
+        if template is None:
+            template = self.templateBank.get(shape, scale)
+            for i in range(level):
+                template = cv2.pyrDown(template)
+            self.coarseTemplates[key] = template
+        return template
+
+    ##
+    # @brief deepest usable pyramid level for a mask slice
+    # @param template full resolution mask slice
+    # @param levels number of pyramid levels available
+    # @return level number of halvings that keep the slice at least min_size wide
+    def levelFor(self, template, levels):
+        level = 0
+        side = min(template.shape)
+        while level < levels and side/2 >= self.min_size:
+            side = side/2
+            level += 1
+        return level
+
+    ##
+    # @brief finds the best match of every mask slice, same outputs as detectObject
+    # @param gray_frame_env single channel frame to search
+    # @param userMask The shape the user/controls wishes to find
+    # @param threshold detection tolerance (ex. threshold = 0.95 --> 95 percent match)
+    # @param div number of slices in the size of the mask
+    # @param size_range maximum scaling of the mask based on the original size
+    # @param levels number of pyramid levels, defaults to the one given at construction
+    # @return locx -vector- X values of the location (center)
+    # @return locy -vector- Y values of the location (center)
+    # @return max_val -vector- maximum correlation values for each mask
+    # @return final_obj -vector- (x,y) size of the best mask for each slice
+    # @return detect True if any slice matched above threshold
+    def search(self, gray_frame_env, userMask, threshold, div=20, size_range=200, levels=None):
+        if levels is None:
+            levels = self.levels
+        bank = self.templateBank
+        bank.precompute(userMask, div, size_range)
+        lb = gray_frame_env.shape
+
+        #build the pyramid once for every slice
+        pyramid = [gray_frame_env]
+        for i in range(levels):
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+
+        #pad the full resolution frame once, wide enough for the biggest slice plus the refinement window
+        biggest = bank.getSlice(userMask, div-2, self.refine_steps, div, size_range)
+        pad_y = math.ceil(biggest.shape[0]/2) + self.margin*(2**levels)
+        pad_x = math.ceil(biggest.shape[1]/2) + self.margin*(2**levels)
+        padded = cv2.copyMakeBorder(gray_frame_env, pad_y, pad_y, pad_x, pad_x, cv2.BORDER_CONSTANT, 0)
+
+        length = div - 1
+        locx = [0]*length
+        locy = [0]*length
+        max_val = [0]*length
+        final_obj = [0]*length
+        detect = False
+        for index in range(length):
+            scale = bank.sliceScale(index, 0, div, size_range)
+            level = self.levelFor(bank.get(userMask, scale), levels)
+            obj = self.getCoarseTemplate(userMask, scale, level)
+            ch1 = math.ceil(obj.shape[0]/2)
+            cw1 = math.ceil(obj.shape[1]/2)
+            envir = cv2.copyMakeBorder(pyramid[level], ch1, ch1, cw1, cw1, cv2.BORDER_CONSTANT, 0)
+            corr = cv2.matchTemplate(envir, obj, self.match_type)
+            m = self.margin*(2**level)
+            for c in range(self.candidates):
+                min_val, coarse_val, min_loc, coarse_loc = cv2.minMaxLoc(corr)
+                #coarse locations are (x,y) centers on the downsampled frame
+                cx = coarse_loc[0]*(2**level)
+                cy = coarse_loc[1]*(2**level)
+                for k in range(self.refine_steps + 1):
+                    b = bank.getSlice(userMask, index, k, div, size_range)
+                    h, w = b.shape
+                    h1 = math.ceil(h/2)
+                    w1 = math.ceil(w/2)
+                    #window of the padded frame holding every placement of the slice centered within m of (cx, cy)
+                    y0 = min(max(cy - h1 + pad_y - m, 0), padded.shape[0] - h - 2*m)
+                    x0 = min(max(cx - w1 + pad_x - m, 0), padded.shape[1] - w - 2*m)
+                    window = padded[y0:y0 + h + 2*m, x0:x0 + w + 2*m]
+                    corrnew = cv2.matchTemplate(window, b, self.match_type)
+                    min_val_new, max_val_new, min_loc_new, max_loc_new = cv2.minMaxLoc(corrnew)
+                    if max_val_new > max_val[index]:
+                        max_val[index] = max_val_new
+                        final_obj[index] = (w, h)
+                        #convert back to the center convention used by detectObject
+                        locx[index] = min(max(x0 + max_loc_new[0] - pad_x + w1, 0), lb[1] - 1)
+                        locy[index] = min(max(y0 + max_loc_new[1] - pad_y + h1, 0), lb[0] - 1)
+                #blank out the neighbourhood of this peak before looking for the next candidate
+                if c + 1 < self.candidates:
+                    cv2.rectangle(corr, (coarse_loc[0] - cw1, coarse_loc[1] - ch1),
+                                  (coarse_loc[0] + cw1, coarse_loc[1] + ch1), 0, -1)
+            if max_val[index] > threshold:
+                detect = True
+
+        return locx, locy, max_val, final_obj, detect
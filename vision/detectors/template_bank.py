@@ -0,0 +1,103 @@
+'''
+template_bank.py - Holds the shape masks used by detectObject.  Each mask is
+read from disk once and every resized slice the detector can ask for is kept
+in memory, keyed by (shape, scale), so no file reads or resizes happen while
+frames are being processed.
+'''
+import os
+import cv2
+
+
+class TemplateBank:
+    # shape name -> file name of its mask inside the mask directory
+    maskFiles = {"circle": "circ_obj.PNG"}
+    #TODO add functionality for other shape masks as they are made. examples below..
+    #maskFiles["square"] = "sq_obj.PNG"
+    #maskFiles["triangle"] = "tri_obj.PNG"
+
+    ##
+    # @param directory directory holding the mask images. Defaults to test_files/ under the current working directory
+    # @param step scale increment used by the refinement loop of detectObject (.2% of the original mask size)
+    def __init__(self, directory=None, step=.002):
+        if directory is None:
+            #in case of windows users, switched backslashes with fwd slashes
+            directory = '/'.join(os.getcwd().split('\\')) + '/test_files/'
+        self.directory = directory
+        self.step = step
+        # shape -> full size mask read from disk
+        self.masks = {}
+        # (shape, scale) -> resized mask
+        self.templates = {}
+        # (shape, div, size_range) combinations that have already been precomputed
+        self.built = set()
+
+    ##
+    # @brief reads the full size mask of a shape from disk (only the first time it is asked for)
+    # @param shape name of the shape, must be a key of maskFiles
+    # @return mask grayscale mask of the shape
+    def getMask(self, shape):
+        if shape not in self.masks:
+            if shape not in self.maskFiles:
+                raise ValueError("No mask defined for shape '%s'" % shape)
+            fullFilePath = os.path.join(self.directory, self.maskFiles[shape])
+            mask = cv2.imread(fullFilePath, cv2.IMREAD_GRAYSCALE)
+            if mask is None:
+                raise IOError("Could not read mask file %s" % fullFilePath)
+            self.masks[shape] = mask
+        return self.masks[shape]
+
+    ##
+    # @brief scale of a mask slice as used by detectObject
+    # @param index index of the slice (0 based)
+    # @param k refinement step of the slice, 0 for the unrefined slice
+    # @param div number of slices in the size of the mask
+    # @param size_range maximum scaling of the mask based on the original size
+    # @return scale resize factor relative to the full size mask
+    def sliceScale(self, index, k=0, div=20, size_range=200):
+        return k*self.step + (index+1)*div/size_range
+
+    ##
+    # @brief number of refinement steps the detectObject loop can take before reaching the next slice
+    # @param div number of slices in the size of the mask
+    # @param size_range maximum scaling of the mask based on the original size
+    # @return kmax largest refinement step
+    def maxStep(self, div=20, size_range=200):
+        return int((div/size_range)/self.step) + 1
+
+    ##
+    # @brief resizes the mask of a shape to every scale detectObject can visit and keeps them in memory
+    # @param shape name of the shape
+    # @param div number of slices in the size of the mask
+    # @param size_range maximum scaling of the mask based on the original size
+    def precompute(self, shape, div=20, size_range=200):
+        if (shape, div, size_range) in self.built:
+            return
+        for index in range(div-1):
+            for k in range(self.maxStep(div, size_range) + 1):
+                self.get(shape, self.sliceScale(index, k, div, size_range))
+        self.built.add((shape, div, size_range))
+
+    ##
+    # @brief looks up a resized mask, resizing (and keeping) it if it was not precomputed
+    # @param shape name of the shape
+    # @param scale resize factor relative to the full size mask
+    # @return template resized mask
+    def get(self, shape, scale):
+        #round the key so scales computed through different float paths land on the same entry
+        key = (shape, round(scale, 9))
+        template = self.templates.get(key)
+        if template is None:
+            template = cv2.resize(self.getMask(shape), (0, 0), fx=scale, fy=scale)
+            self.templates[key] = template
+        return template
+
+    ##
+    # @brief looks up a mask slice the same way detectObject indexes them
+    # @param shape name of the shape
+    # @param index index of the slice (0 based)
+    # @param k refinement step of the slice, 0 for the unrefined slice
+    # @param div number of slices in the size of the mask
+    # @param size_range maximum scaling of the mask based on the original size
+    # @return template resized mask
+    def getSlice(self, shape, index, k=0, div=20, size_range=200):
+        return self.get(shape, self.sliceScale(index, k, div, size_range))
@@ -0,0 +1,62 @@
+'''
+assignment.py - Optimal one-to-one assignment of tracks to detections
+(the Hungarian method, in its shortest augmenting path form).  Each row is
+added with one augmenting path search whose inner step is vectorized over
+all columns, so matching n tracks to m detections costs O(n*n*m) NumPy work.
+'''
+import numpy as np
+
+
+##
+# @brief pairs rows with columns so that the summed cost of the pairs is as small as possible
+# @param cost (n, m) array of finite costs, row i paired with column j costs cost[i, j]
+# @return rows, cols index arrays of the min(n, m) pairs, sorted by row
+def linearAssignment(cost):
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    # every row gets a column, so there have to be at least as many columns as rows
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    # row and column potentials, 1 based with column 0 as the virtual start of each augmenting path
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # p[j] row paired with column j (0 if none), way[j] previous column on the path to j
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            # reduced cost of reaching every free column through row i0
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # flip the pairs along the path back to the start
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.flatnonzero(p[1:])
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
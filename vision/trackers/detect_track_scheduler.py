@@ -0,0 +1,310 @@
+'''
+detect_track_scheduler.py - Decides, frame by frame, whether the object is
+only tracked, re-detected in a window around it, or searched for in the
+whole frame.  Instead of a fixed cadence (full detection every 30 frames,
+window detection every 10), a detection is run when the tracker is unsure,
+when the object moves fast enough to leave its window, or when it has been
+tracked unchecked for too long, and only if the expected cost of the
+detection fits in what is left of the frame's time budget.  The window the
+object is re-detected in is placed and sized by a Kalman filter following
+the tracker's box.  Every decision is kept, with its reason, for logging.
+'''
+from collections import deque
+import cv2
+from .kalman_filter import ConstantVelocityKalman
+
+# what the scheduler did on a frame
+TRACK = 'track'
+LOCAL = 'local'
+GLOBAL = 'global'
+
+
+class DetectTrackScheduler:
+    ##
+    # @param tools VisionTools used to detect and track
+    # @param userMask shape of the object, see VisionTools.detectObject
+    # @param userColor color of the object
+    # @param tracker_type type of tracker, see tracker_registry.availableTrackers
+    # @param threshold detection tolerance (ex. threshold = 0.95 --> 95 percent match)
+    # @param budget_ms milliseconds one frame may take, detections that are not expected to fit are put off
+    # @param pyramid_levels pyramid levels of the full frame detection
+    # @param adaptive use the adaptive color model instead of the fixed color range
+    # @param min_confidence tracker confidence below which the object is re-detected around the tracker's box
+    # @param local_interval most frames the object is tracked at full confidence before it is re-detected around its box
+    # @param global_interval most frames between full frame searches while the object is tracked
+    # @param max_motion speed (fraction of the object size per frame) above which the object is re-detected around its box
+    # @param max_misses local re-detections in a row that may miss the object before the tracker's box is no longer trusted
+    # @param n_sigma standard deviations of the predicted position the re-detection window reaches past the object
+    # @param history number of decisions kept
+    def __init__(self, tools, userMask, userColor, tracker_type='KCF', threshold=0.4, budget_ms=33.0, pyramid_levels=2,
+                 adaptive=False, min_confidence=0.5, local_interval=10, global_interval=90, max_motion=0.25, max_misses=3,
+                 n_sigma=3.0, history=300):
+        self.tools = tools
+        self.userMask = userMask
+        self.userColor = userColor
+        self.tracker_type = tracker_type
+        self.threshold = threshold
+        self.budget_ms = budget_ms
+        self.pyramid_levels = pyramid_levels
+        self.adaptive = adaptive
+        self.min_confidence = min_confidence
+        self.local_interval = local_interval
+        self.global_interval = global_interval
+        self.max_motion = max_motion
+        self.max_misses = max_misses
+        self.n_sigma = n_sigma
+        self.tracker = None
+        # position and velocity of the center of the object
+        self.motion = ConstantVelocityKalman(1)
+        # running average of the milliseconds each kind of step takes, 0 until it has been seen once
+        self.cost = {TRACK: 0.0, LOCAL: 0.0, GLOBAL: 0.0}
+        self.decisions = deque(maxlen=history)
+        self.reset()
+
+    ##
+    # @brief forgets the object, the next frame is searched in full
+    def reset(self):
+        self.ok = False
+        self.bbox = None
+        self.confidence = 0.0
+        self.velocity = (0.0, 0.0)
+        self.misses = 0
+        self.frame_count = 0
+        self.last_local = 0
+        self.last_global = 0
+        self.candidate = None
+        self.decision = None
+
+    ##
+    # @brief processes one frame
+    # @param frame BGR frame from the camera
+    # @return ok True if the object is known in this frame
+    # @return bbox (x, y, w, h) of the object, None if it is not known
+    # @return confidence confidence in bbox, 0 to 1
+    def step(self, frame):
+        timer = cv2.getTickCount()
+        self.frame_count += 1
+        actions = []
+        reason = None
+        mask_env = None
+
+        if self.ok:
+            self.motion.predict()
+            ok, bbox, confidence, timing = self.tools.trackStep(frame, self.tracker)
+            self.learnCost(TRACK, timing)
+            actions.append(TRACK)
+            if ok:
+                self.bbox = bbox
+            # a lost object keeps its last box, the local search looks for it there
+            self.ok = ok
+            # every local re-detection that missed the object halves the confidence in the tracker
+            self.confidence = confidence*0.5**self.misses
+            reason = self.localReason()
+            found = False
+            if reason is not None and self.fits(LOCAL, timer, self.frame_count - self.last_local >= 2*self.local_interval):
+                mask_env = self.colorMask(frame)
+                start = cv2.getTickCount()
+                # the window is placed on the prediction, before this frame's measurement
+                found = self.detectLocal(frame, mask_env)
+                self.learnCost(LOCAL, self.elapsed(start))
+                actions.append(LOCAL)
+                self.last_local = self.frame_count
+                if not found:
+                    reason += ', not found in window'
+                    self.miss()
+            elif reason is not None:
+                reason += ', local put off by budget'
+            # one measurement per frame: a local detection already updated the filter, otherwise the tracker's box does
+            if ok and not found:
+                self.motion.update(0, self.center(bbox))
+            self.velocity = tuple(self.motion.getVelocities(0).tolist())
+
+        if not self.ok:
+            # nothing else to do with the frame when the object is lost, so the full search always runs
+            reason = reason or 'no object'
+            if mask_env is None:
+                mask_env = self.colorMask(frame)
+            start = cv2.getTickCount()
+            self.detectGlobal(frame, mask_env)
+            self.learnCost(GLOBAL, self.elapsed(start))
+            actions.append(GLOBAL)
+            self.last_global = self.frame_count
+        elif self.frame_count - self.last_global >= self.global_interval:
+            if self.fits(GLOBAL, timer, self.frame_count - self.last_global >= 2*self.global_interval):
+                if mask_env is None:
+                    mask_env = self.colorMask(frame)
+                start = cv2.getTickCount()
+                self.detectGlobal(frame, mask_env)
+                self.learnCost(GLOBAL, self.elapsed(start))
+                actions.append(GLOBAL)
+                self.last_global = self.frame_count
+                reason = (reason + ', ' if reason else '') + 'global interval'
+            else:
+                reason = (reason + ', ' if reason else '') + 'global put off by budget'
+
+        self.decision = {'frame': self.frame_count,
+                         'actions': actions,
+                         'reason': reason or 'tracking',
+                         'ok': self.ok,
+                         'confidence': self.confidence,
+                         'velocity': self.velocity,
+                         'candidate': self.candidate,
+                         'ms': self.elapsed(timer)}
+        self.decisions.append(self.decision)
+        return self.ok, self.bbox if self.ok else None, self.confidence
+
+    ##
+    # @return reason to re-detect the object around the tracker's box, None if tracking alone is enough
+    def localReason(self):
+        if not self.ok:
+            return 'tracker lost the object'
+        if self.confidence < self.min_confidence:
+            return 'low confidence %.2f' % self.confidence
+        size = max(min(self.bbox[2], self.bbox[3]), 1)
+        speed = max(abs(self.velocity[0]), abs(self.velocity[1]))/size
+        if speed > self.max_motion:
+            return 'fast motion %.2f' % speed
+        # the less sure the tracker is, the sooner its box is checked
+        if self.frame_count - self.last_local >= self.local_interval*self.confidence:
+            return 'local interval'
+        return None
+
+    ##
+    # @brief a local re-detection missed the object: the tracker's box is checked again sooner, and dropped after
+    #        max_misses misses in a row, since a tracker that drifted off the object can go on reporting success
+    def miss(self):
+        self.misses += 1
+        self.confidence *= 0.5
+        if self.misses >= self.max_misses:
+            self.ok = False
+            self.confidence = 0.0
+
+    ##
+    # @brief checks whether a step is expected to finish inside the frame's budget
+    # @param action LOCAL or GLOBAL
+    # @param timer tick count at the start of the frame
+    # @param overdue the step was put off for too long and runs anyway, so a budget that is always too tight cannot starve it
+    def fits(self, action, timer, overdue=False):
+        return overdue or self.elapsed(timer) + self.cost[action] <= self.budget_ms
+
+    ##
+    # @return milliseconds since the tick count start
+    def elapsed(self, start):
+        return 1000.0*(cv2.getTickCount() - start)/cv2.getTickFrequency()
+
+    ##
+    # @brief folds the duration of a step into its running average
+    def learnCost(self, action, ms):
+        self.cost[action] = ms if self.cost[action] == 0 else 0.8*self.cost[action] + 0.2*ms
+
+    ##
+    # @return center (x, y) of a box
+    def center(self, bbox):
+        return bbox[0] + bbox[2]/2, bbox[1] + bbox[3]/2
+
+    def colorMask(self, frame):
+        blur = cv2.GaussianBlur(frame, (5, 5), 0)
+        return self.tools.findObjWColor(blur, self.userColor, adaptive=self.adaptive)
+
+    ##
+    # @brief window the object is searched for in: the object's box around its predicted center, widened by
+    #        n_sigma standard deviations of the prediction, so it shrinks while the track is steady and grows while it is lost
+    def searchWindow(self, frame_shape):
+        w, h = self.bbox[2], self.bbox[3]
+        center = self.motion.getPositions(0).tolist()
+        spread = self.motion.searchRadius(0, self.n_sigma)[0].tolist()
+        return self.tools.searchWindow(center, (w, h), frame_shape, spread, margin=0)
+
+    ##
+    # @brief re-detects the object around its box and moves the tracker onto it
+    # @return found True if the object was detected in the window
+    def detectLocal(self, frame, mask_env):
+        if self.bbox is None:
+            return False
+        window = self.searchWindow(frame.shape)
+        result = self.tools.detectObjectInWindows(frame, mask_env, self.userMask, self.threshold, windows=[window])
+        return self.accept(frame, result, False)
+
+    ##
+    # @brief searches the whole frame, except around the object when it is being tracked. A detection made while the
+    #        object is tracked never moves the tracker, since it is as likely a second object or a false match as the
+    #        object itself: it is only kept as a candidate, see getCandidate
+    # @return found True if an object was detected
+    def detectGlobal(self, frame, mask_env):
+        if not self.ok:
+            result = self.tools.detectObject(frame, mask_env, self.userMask, self.threshold,
+                                             pyramid_levels=self.pyramid_levels)
+            return self.accept(frame, result, True)
+        result = self.tools.detectObjectInWindows(frame, mask_env, self.userMask, self.threshold,
+                                                  exclusions=[self.searchWindow(frame.shape)])
+        bbox = self.checkDetection(frame, result)
+        self.candidate = None if bbox is None else {'frame': self.frame_count, 'bbox': bbox,
+                                                    'score': max(result[3])}
+        return bbox is not None
+
+    ##
+    # @brief checks the color of a detection and boxes it
+    # @param result outputs of detectObject
+    # @param learn True to also update the color model with the detection, only for detections taken as the object
+    # @return bbox (x, y, w, h) of the detection, None if it is not the object's color or has no size
+    def checkDetection(self, frame, result, learn=False):
+        obj_cent, locx, locy, max_val, final_obj, small_ROI, detect = result
+        if not detect:
+            return None
+        if not self.tools.checkColor(self.tools.avgColorValue(small_ROI), userColor=self.userColor, adaptive=self.adaptive):
+            return None
+        if learn:
+            #only the pixels of small_ROI that fit the color are learned, not the water around the object
+            self.tools.updateColorModel(self.userColor, small_ROI)
+        p1, p2, bbox, percent_area, big_ROI, mask_big_ROI = self.tools.BBoxAndROIS(obj_cent, frame, self.userColor, final_obj,
+                                                                                   adaptive=self.adaptive, max_val=max_val,
+                                                                                   locx=locx, locy=locy)
+        if bbox[2] == 0 or bbox[3] == 0:
+            return None
+        return tuple(bbox)
+
+    ##
+    # @brief checks a detection and, if it is the object, (re)initializes the tracker on it
+    # @param result outputs of detectObject
+    # @param new True if the detection may be a different object (full frame search while the object is lost),
+    #        its motion is started over
+    # @return found True if the detection was accepted
+    def accept(self, frame, result, new):
+        bbox = self.checkDetection(frame, result, learn=True)
+        if bbox is None:
+            return False
+        # the tracker is moved to the new box rather than built again
+        ok, self.tracker = self.tools.trackerInit(frame, self.tracker_type, bbox, self.tracker)
+        if ok:
+            self.ok, self.bbox, self.confidence = True, bbox, 1.0
+            self.misses = 0
+            if new:
+                self.motion.start(0, self.center(bbox))
+                self.candidate = None
+            else:
+                self.motion.update(0, self.center(bbox))
+            # a fresh detection checks the box as well as a local one
+            self.last_local = self.frame_count
+        return ok
+
+    ##
+    # @return decision dictionary describing the last frame: frame number, actions run, reason, ok, confidence,
+    #         velocity, candidate and milliseconds spent. None before the first frame
+    def getDecision(self):
+        return self.decision
+
+    ##
+    # @return candidate dictionary of the last object the full frame search found away from the tracked one while it
+    #         was tracked: frame number, bbox and score. None if that search found nothing
+    def getCandidate(self):
+        return self.candidate
+
+    ##
+    # @return decisions the last decisions, oldest first
+    def getDecisions(self):
+        return list(self.decisions)
+
+    ##
+    # @return cost running average of the milliseconds spent tracking, detecting locally and detecting globally
+    def getCosts(self):
+        return dict(self.cost)
@@ -0,0 +1,106 @@
+'''
+kalman_filter.py - Constant velocity Kalman filter for the image position of
+several targets at once.  Every target is a slot in fixed (N, 4) state and
+(N, 4, 4) covariance arrays, and the predict and update steps of all the
+targets are done together with batched matrix products.  Besides the
+predicted position, the filter gives how uncertain it is, which sizes the
+windows the targets are searched for in and the gates detections are
+matched through.
+'''
+import numpy as np
+
+# squared Mahalanobis distance inside which 99% of the measurements of a target fall (chi-square, 2 degrees of freedom)
+gate99 = 9.21
+
+
+class ConstantVelocityKalman:
+    ##
+    # @param max_targets number of slots
+    # @param process_noise standard deviation (pixels/frame^2) of the change in velocity between frames
+    # @param measurement_noise standard deviation (pixels) of a measured position
+    # @param init_velocity_std standard deviation (pixels/frame) of the velocity of a new target
+    def __init__(self, max_targets=8, process_noise=1.0, measurement_noise=4.0, init_velocity_std=20.0):
+        self.measurement_noise = measurement_noise
+        self.init_velocity_std = init_velocity_std
+        # state is (x, y, vx, vy), one frame per step
+        self.F = np.eye(4)
+        self.F[0, 2] = self.F[1, 3] = 1
+        # velocity changes by a random acceleration every frame
+        G = np.array([[0.5, 0], [0, 0.5], [1, 0], [0, 1]])
+        self.Q = process_noise**2*G.dot(G.T)
+        self.R = measurement_noise**2*np.eye(2)
+        self.x = np.zeros((max_targets, 4))
+        self.P = np.tile(np.eye(4), (max_targets, 1, 1))
+
+    ##
+    # @brief starts targets at measured positions, with no velocity
+    # @param slots (n,) slot indices
+    # @param positions (n, 2) measured positions
+    def start(self, slots, positions):
+        slots = np.atleast_1d(slots)
+        self.x[slots, :2] = np.reshape(positions, (-1, 2))
+        self.x[slots, 2:] = 0
+        self.P[slots] = np.diag([self.measurement_noise**2]*2 + [self.init_velocity_std**2]*2)
+
+    ##
+    # @brief moves targets one frame ahead
+    # @param slots slot indices, None for every slot
+    def predict(self, slots=None):
+        if slots is None:
+            slots = slice(None)
+        self.x[slots] = self.x[slots].dot(self.F.T)
+        self.P[slots] = np.matmul(np.matmul(self.F, self.P[slots]), self.F.T) + self.Q
+
+    ##
+    # @brief corrects predicted targets with measured positions
+    # @param slots (n,) slot indices
+    # @param positions (n, 2) measured positions, the i-th belongs to slots[i]
+    def update(self, slots, positions):
+        slots = np.atleast_1d(slots)
+        positions = np.reshape(positions, (-1, 2))
+        P = self.P[slots]
+        # only the position is measured, so H P and H P H^T are slices of P
+        S = P[:, :2, :2] + self.R
+        K = np.matmul(P[:, :, :2], np.linalg.inv(S))
+        y = positions - self.x[slots, :2]
+        self.x[slots] += np.matmul(K, y[:, :, None])[:, :, 0]
+        self.P[slots] = P - np.matmul(K, P[:, :2, :])
+
+    ##
+    # @param slots slot indices, None for every slot, or a single slot index
+    # @return positions (n, 2) estimated positions, (2,) for a single slot
+    def getPositions(self, slots=None):
+        return self.x[slice(None) if slots is None else slots, :2]
+
+    ##
+    # @param slots slot indices, None for every slot, or a single slot index
+    # @return velocities (n, 2) estimated velocities in pixels per frame, (2,) for a single slot
+    def getVelocities(self, slots=None):
+        return self.x[slice(None) if slots is None else slots, 2:]
+
+    ##
+    # @param slots slot indices, None for every slot
+    # @return S (n, 2, 2) covariance of the next measured position around the estimated one
+    def innovation(self, slots=None):
+        return self.P[slice(None) if slots is None else np.atleast_1d(slots), :2, :2] + self.R
+
+    ##
+    # @brief half size of the window a target's next measurement is expected in
+    # @param slots slot indices, None for every slot
+    # @param n_sigma number of standard deviations the window reaches
+    # @return radius (n, 2) half width and half height of the window
+    def searchRadius(self, slots=None, n_sigma=3.0):
+        S = self.innovation(slots)
+        return n_sigma*np.sqrt(np.stack([S[:, 0, 0], S[:, 1, 1]], axis=1))
+
+    ##
+    # @brief squared Mahalanobis distance between every target and every measurement
+    # @param slots (n,) slot indices
+    # @param positions (m, 2) measured positions
+    # @return d2 (n, m) squared distances, gate99 is the 99% gate
+    def mahalanobis(self, slots, positions):
+        slots = np.atleast_1d(slots)
+        positions = np.reshape(positions, (-1, 2))
+        Sinv = np.linalg.inv(self.innovation(slots))
+        d = positions[None, :, :] - self.x[slots, None, :2]
+        return np.einsum('nmi,nij,nmj->nm', d, Sinv, d)
@@ -0,0 +1,121 @@
+'''
+multi_target_tracker.py - Keeps several targets (e.g. the buoys) apart from
+frame to frame.  Each frame, every track is moved ahead by a constant
+velocity Kalman filter, a cost matrix combining the Mahalanobis distance and
+the color difference between every track and every detection is built in one
+broadcast, and detections are paired with tracks by optimal assignment.  A
+detection is only considered for a track inside the track's own uncertainty
+gate, which is tight for a steady track and widens while it goes unseen.  Tracks that go unseen for too long are
+dropped, and the number of tracks is fixed, so the cost per frame stays flat
+over a long dive.
+'''
+import numpy as np
+from .assignment import linearAssignment
+from .kalman_filter import ConstantVelocityKalman, gate99
+
+
+class MultiTargetTracker:
+    # cost given to pairs outside the gates, never accepted as a match
+    gated = 1e6
+
+    ##
+    # @param max_tracks most targets tracked at once
+    # @param max_age frames a track is kept without a matching detection
+    # @param max_distance largest distance (pixels) between a track's predicted position and its detection, whatever its gate
+    # @param max_color largest summed |B|+|G|+|R| difference between a track's color and its detection
+    # @param color_weight weight of the color difference in the cost, relative to the distance
+    # @param smoothing weight of a new measurement in the track's color (1 keeps only the newest)
+    # @param gate squared Mahalanobis distance from a track's prediction beyond which a detection is not matched to it
+    # @param process_noise, measurement_noise noise of the motion model, see ConstantVelocityKalman
+    def __init__(self, max_tracks=8, max_age=15, max_distance=100, max_color=250, color_weight=1.0, smoothing=0.5,
+                 gate=gate99, process_noise=2.0, measurement_noise=4.0):
+        self.max_tracks = max_tracks
+        self.max_age = max_age
+        self.max_distance = max_distance
+        self.max_color = max_color
+        self.color_weight = color_weight
+        self.smoothing = smoothing
+        self.gate = gate
+        # one slot per track, only the active ones are in use
+        self.active = np.zeros(max_tracks, dtype=bool)
+        self.ids = np.full(max_tracks, -1, dtype=int)
+        # position and velocity of every slot
+        self.motion = ConstantVelocityKalman(max_tracks, process_noise, measurement_noise)
+        self.color = np.zeros((max_tracks, 3))
+        # frames since the last matching detection, and number of matching detections
+        self.age = np.zeros(max_tracks, dtype=int)
+        self.hits = np.zeros(max_tracks, dtype=int)
+        self.nextId = 0
+
+    ##
+    # @brief moves every track ahead to the next frame, its uncertainty grows
+    def predict(self):
+        slots = np.flatnonzero(self.active)
+        self.motion.predict(slots)
+        self.age[slots] += 1
+
+    ##
+    # @brief cost of pairing every active track with every detection
+    # @param slots (n,) slot indices of the tracks
+    # @param locations (m, 2) detection centers
+    # @param colors (m, 3) detection colors
+    # @return cost (n, m) array, gated where a pair is too far apart in position or color
+    def costMatrix(self, slots, locations, colors):
+        d2 = self.motion.mahalanobis(slots, locations)
+        distance = np.linalg.norm(self.motion.getPositions(slots)[:, None, :] - locations[None, :, :], axis=2)
+        color = np.abs(self.color[slots, None, :] - colors[None, :, :]).sum(axis=2)
+        cost = np.sqrt(d2/self.gate) + self.color_weight*color/self.max_color
+        cost[(d2 > self.gate) | (distance > self.max_distance) | (color > self.max_color)] = self.gated
+        return cost
+
+    ##
+    # @brief updates the tracks with the detections of one frame
+    # @param locations (m, 2) centers of the detections
+    # @param colors (m, 3) colors of the detections
+    # @return ids (m,) id of the track each detection was given, -1 if no track was free for it
+    def update(self, locations, colors):
+        locations = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        colors = np.asarray(colors, dtype=np.float64).reshape(-1, 3)
+        self.predict()
+        ids = np.full(len(locations), -1, dtype=int)
+        slots = np.flatnonzero(self.active)
+        matched = np.zeros(len(locations), dtype=bool)
+        if len(slots) and len(locations):
+            cost = self.costMatrix(slots, locations, colors)
+            rows, cols = linearAssignment(cost)
+            keep = cost[rows, cols] < self.gated
+            rows, cols = rows[keep], cols[keep]
+            track = slots[rows]
+            self.motion.update(track, locations[cols])
+            self.color[track] += self.smoothing*(colors[cols] - self.color[track])
+            self.age[track] = 0
+            self.hits[track] += 1
+            ids[cols] = self.ids[track]
+            matched[cols] = True
+        # tracks that were not seen for too long are freed before new ones are started
+        self.active &= self.age <= self.max_age
+        for index in np.flatnonzero(~matched):
+            free = np.flatnonzero(~self.active)
+            if len(free) == 0:
+                break
+            slot = free[0]
+            self.active[slot] = True
+            self.ids[slot] = self.nextId
+            self.motion.start(slot, locations[index])
+            self.color[slot] = colors[index]
+            self.age[slot] = 0
+            self.hits[slot] = 1
+            ids[index] = self.nextId
+            self.nextId += 1
+        return ids
+
+    ##
+    # @return tracks list of (id, (x, y), (vx, vy), (b, g, r), age, hits) of the active tracks
+    def getTracks(self):
+        return [(int(self.ids[s]), tuple(self.motion.getPositions(s).tolist()), tuple(self.motion.getVelocities(s).tolist()),
+                 tuple(self.color[s].tolist()), int(self.age[s]), int(self.hits[s])) for s in np.flatnonzero(self.active)]
+
+    ##
+    # @brief drops every track
+    def reset(self):
+        self.active[:] = False
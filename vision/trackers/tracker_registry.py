@@ -0,0 +1,147 @@
+'''
+tracker_registry.py - The OpenCV object trackers behind one interface.
+Where the tracker constructors live has moved between OpenCV versions
+(cv2.Tracker_create before 3.3, cv2.TrackerKCF_create after, cv2.legacy and
+cv2.TrackerKCF.create in 4.x), so every location is probed once, when this
+module is imported.  A ManagedTracker keeps its OpenCV tracker and puts it
+on a new bounding box without building a new one whenever the tracker
+allows it.
+'''
+import cv2
+
+# tracker type -> name used in the OpenCV constructor names
+trackerNames = {'BOOSTING': 'Boosting',
+                'MIL': 'MIL',
+                'KCF': 'KCF',
+                'TLD': 'TLD',
+                'MEDIANFLOW': 'MedianFlow',
+                'GOTURN': 'GOTURN',
+                'CSRT': 'CSRT',
+                'MOSSE': 'MOSSE'}
+
+
+##
+# @brief finds the constructor of every tracker type this OpenCV build has
+# @return constructors {tracker type: (function that makes a new tracker, True if it is a cv2.legacy tracker)}
+def probeConstructors():
+    constructors = {}
+    (major_ver, minor_ver, subminor_ver) = (cv2.__version__).split('.')[:3]
+    if int(major_ver) < 3 or (int(major_ver) == 3 and int(minor_ver) < 3):
+        # before 3.3 there is a single constructor that takes the type as a string
+        if hasattr(cv2, 'Tracker_create'):
+            for tracker_type in trackerNames:
+                constructors[tracker_type] = (lambda t=tracker_type: cv2.Tracker_create(t), True)
+        return constructors
+    legacy = getattr(cv2, 'legacy', None)
+    for tracker_type, name in trackerNames.items():
+        # newest interface first: only its trackers can be initialized again on a new box
+        cls = getattr(cv2, 'Tracker' + name, None)
+        if hasattr(cls, 'create'):
+            constructors[tracker_type] = (cls.create, False)
+        elif hasattr(cv2, 'Tracker' + name + '_create'):
+            # up to 4.4 these still make the old contrib trackers, which refuse a second init
+            constructors[tracker_type] = (getattr(cv2, 'Tracker' + name + '_create'), True)
+        elif legacy is not None and hasattr(legacy, 'Tracker' + name + '_create'):
+            constructors[tracker_type] = (getattr(legacy, 'Tracker' + name + '_create'), True)
+    return constructors
+
+
+# probed once for the whole process
+constructors = probeConstructors()
+
+
+##
+# @return names of the tracker types this OpenCV build can make
+def availableTrackers():
+    return list(constructors)
+
+
+##
+# @brief makes a new OpenCV tracker
+# @param tracker_type one of the keys of trackerNames
+# @return tracker new, uninitialized OpenCV tracker
+def createTracker(tracker_type):
+    if tracker_type not in constructors:
+        raise ValueError("Tracker type '%s' is not available in OpenCV %s, available: %s"
+                         % (tracker_type, cv2.__version__, ', '.join(availableTrackers())))
+    return constructors[tracker_type][0]()
+
+
+class ManagedTracker:
+    ##
+    # @param tracker_type one of availableTrackers()
+    def __init__(self, tracker_type):
+        self.tracker_type = tracker_type
+        self.tracker = createTracker(tracker_type)
+        # legacy trackers refuse a second init and have to be built again
+        self.legacy = constructors[tracker_type][1]
+        self.initialized = False
+        self.confidence = 0.0
+        # number of OpenCV trackers built so far, for profiling
+        self.constructions = 1
+
+    ##
+    # @brief starts tracking an object
+    # @param frame frame the object is in
+    # @param bbox (x, y, w, h) box around the object
+    # @return ok True if the tracker accepted the box
+    def init(self, frame, bbox):
+        if self.initialized:
+            return self.reset(frame, bbox)
+        bbox = tuple(int(round(v)) for v in bbox)
+        ok = self.tracker.init(frame, bbox)
+        # the newer interface returns None instead of True
+        self.initialized = ok is None or bool(ok)
+        return self.initialized
+
+    ##
+    # @brief follows the object into the next frame
+    # @param frame next frame
+    # @return ok True if the object was found
+    # @return bbox (x, y, w, h) box around the object
+    def update(self, frame):
+        if not self.initialized:
+            self.confidence = 0.0
+            return False, None
+        ok, bbox = self.tracker.update(frame)
+        # trackers without a score of their own report -1 (or have no getTrackingScore), their confidence is just ok
+        score = self.tracker.getTrackingScore() if ok and hasattr(self.tracker, 'getTrackingScore') else -1.0
+        self.confidence = float(score) if score >= 0 else float(ok)
+        return ok, bbox
+
+    ##
+    # @brief puts the tracker on a new box, reusing the OpenCV tracker unless it is a legacy one
+    # @param frame frame the object is in
+    # @param bbox (x, y, w, h) box around the object
+    # @return ok True if the tracker accepted the box
+    def reset(self, frame, bbox):
+        reuse = not self.legacy
+        if not reuse:
+            self.rebuild()
+        self.initialized = False
+        ok = self.init(frame, bbox)
+        if not ok and reuse:
+            # some trackers refuse a second init without saying so in their type: built again once, and if the new
+            # one takes the box, never reused again
+            self.rebuild()
+            ok = self.init(frame, bbox)
+            self.legacy = ok
+        return ok
+
+    ##
+    # @brief replaces the OpenCV tracker with a new, uninitialized one
+    def rebuild(self):
+        self.tracker = createTracker(self.tracker_type)
+        self.constructions += 1
+        self.initialized = False
+
+    ##
+    # @return confidence of the last update, 0 to 1
+    def getConfidence(self):
+        return self.confidence
+
+    def getType(self):
+        return self.tracker_type
+
+    def isInitialized(self):
+        return self.initialized
@@ -5,8 +5,20 @@ target tracking.
 '''
 import numpy as np
 import cv2
-import math
-import os
+from .detectors.template_bank import TemplateBank
+from .detectors.pyramid_search import PyramidSearch
+from .detectors.fft_correlator import FFTCorrelator
+from .detectors.object_detector import ObjectDetector
+from .detectors.color_segmenter import ColorSegmenter
+from .detectors.integral_image import IntegralImage
+from .detectors.color_model import AdaptiveColorModel
+from .detectors.line_geometry import midlinePoints, fitLine
+from .detectors.line_detector import LineDetector
+from .detectors.line_tracker import LineTracker
+from .detectors.contour_select import largestContours
+from .detectors.background_model import BackgroundModel
+from .trackers.multi_target_tracker import MultiTargetTracker
+from .trackers.tracker_registry import ManagedTracker
 
 
 class VisionTools:
@@ -18,80 +30,104 @@ class VisionTools:
     def __init__(self):
         # Dummy variable, not used for anything
         self.useme = True
+        # shape masks used by detectObject, loaded and resized once
+        self.templateBank = TemplateBank()
+        # coarse-to-fine search used by detectObject when pyramid_levels > 0
+        self.pyramidSearch = PyramidSearch(self.templateBank)
+        # batched FFT correlation used by detectObject when use_fft is True
+        self.fftCorrelator = FFTCorrelator()
+        # (shape, rows, cols, div, size_range) -> ObjectDetector with preallocated buffers
+        self.detectors = {}
+        # named color ranges used by findObjWColor and checkColor, compiled once
+        self.colorSegmenter = ColorSegmenter()
+        # summed-area table of the current frame, for constant time ROI colors
+        self.integralImage = IntegralImage()
+        # running per pixel background, seeded with the average color of the first frame
+        self.backgroundModel = BackgroundModel()
+        # color statistics that follow the object's color underwater, seeded from the segmenter's ranges
+        self.colorModel = AdaptiveColorModel(self.colorSegmenter)
+        # line detection of the downward camera, with its frame buffers
+        self.lineDetector = LineDetector()
+        # follows the line between frames, falling back to lineDetector when it is lost
+        self.lineTracker = LineTracker(self.lineDetector)
 
     ##
     # @brief initializes tracker based on user defined tracker type
     # @param frame first frame of the video that contains a bounding box
     # @param tracker_type type of tracker being used as defined by the user
-    # @param bbox bounding box around object, passed in by BBoxAndROIS function: [upper corner, lower corner, width, height]
+    # @param bbox bounding box around object, passed in by BBoxAndROIS function: [upper left x, upper left y, width, height]
+    # @param tracker tracker returned by an earlier call, re-initialized on bbox instead of building a new one
     # @return None if there is no bounding box, thus no object in frame, do not initialize tracker
     # @return ok confirmation that the tracker has been initialized
-    # @return tracker the tracker object that was created
-    def trackerInit(self, frame, tracker_type, bbox):
-        (major_ver, minor_ver, subminor_ver) = (cv2.__version__).split('.')
-        #FIXME offsets added to move bounding box up. Need to see if bbox being low is consistent with other cases
-        #Note: only needed for test_detectAndTrack.py
-        y_offset = 170
-        x_offset = 20
+    # @return tracker the ManagedTracker that was created or re-initialized
+    def trackerInit(self, frame, tracker_type, bbox, tracker=None):
         if bbox is None:
             print("No object in frame")
             return None
         else:
-            if int(minor_ver) < 3:
-                tracker = cv2.Tracker_create(tracker_type)
-            else:
-                if tracker_type == 'BOOSTING':
-                    tracker = cv2.TrackerBoosting_create()
-                if tracker_type == 'MIL':
-                    tracker = cv2.TrackerMIL_create()
-                if tracker_type == 'KCF':
-                    tracker = cv2.TrackerKCF_create()
-                if tracker_type == 'TLD':
-                    tracker = cv2.TrackerTLD_create()
-                if tracker_type == 'MEDIANFLOW':
-                    tracker = cv2.TrackerMedianFlow_create()
-                if tracker_type == 'GOTURN':
-                    tracker = cv2.TrackerGOTURN_create()
-            bbox = (bbox[0] + x_offset, bbox[1] - y_offset, bbox[2], bbox[3])
+            if tracker is None or tracker.getType() != tracker_type:
+                tracker = ManagedTracker(tracker_type)
+            # an existing tracker is put on the new box without being built again
             ok = tracker.init(frame, bbox)
             return ok, tracker
 
 
     ##
-    # @brief tracks object in frame bounded by bounding box
+    # @brief follows the object into the next frame without drawing anything, for use on the sub
     # @param frame current frame with object being tracked
-    # @param tracker_type type of tracker as defined by the user
-    # @param bbox initial bbox passed in by trackerInit: [upper corner, lower corner, width, height]
-    # @param tracker object initialized in trackerInit
-    # @param ok confirmation that tracker is initialized
-    # @return final final image with bounding box around object
-    def track(self, frame, tracker_type, bbox, tracker, ok):
-        #start timer
+    # @param tracker ManagedTracker initialized in trackerInit
+    # @return ok True if the object was found
+    # @return bbox new bounding box of the object: (upper left x, upper left y, width, height), None if it was lost
+    # @return confidence confidence of the tracker in bbox, 0 to 1
+    # @return timing milliseconds spent updating the tracker
+    def trackStep(self, frame, tracker):
         timer = cv2.getTickCount()
-
-        #update tracker
         ok, bbox = tracker.update(frame)
+        timing = 1000.0*(cv2.getTickCount() - timer)/cv2.getTickFrequency()
+        if ok:
+            bbox = tuple(int(v) for v in bbox)
+        else:
+            bbox = None
+        return ok, bbox, tracker.getConfidence(), timing
 
-        #calculate frames per second
-        fps = cv2.getTickFrequency() / (cv2.getTickCount() - timer)
-
-        #draw bounding boxes
+    ##
+    # @brief draws the result of trackStep on a frame, only needed when there is a display
+    # @param frame frame to draw on, it is changed in place
+    # @param tracker_type type of tracker as defined by the user
+    # @param ok success returned by trackStep
+    # @param bbox bounding box returned by trackStep
+    # @param timing milliseconds returned by trackStep, shown as frames per second
+    # @return frame the same frame with the overlay
+    def drawTracking(self, frame, tracker_type, ok, bbox, timing):
         if ok:
             #tracking success
-            p1 = (int(bbox[0]), int(bbox[1]))
-            p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
-            final = cv2.rectangle(frame, p1, p2, (255,0,0), 2, 1)
+            p1 = (bbox[0], bbox[1])
+            p2 = (bbox[0] + bbox[2], bbox[1] + bbox[3])
+            cv2.rectangle(frame, p1, p2, (255,0,0), 2, 1)
         else:
             #tracking failure
-            final = cv2.putText(frame, "Tracking failure detected", (100,80), cv2.FONT_HERSHEY_SIMPLEX, 0.75,(0, 0, 255),2)
+            cv2.putText(frame, "Tracking failure detected", (100,80), cv2.FONT_HERSHEY_SIMPLEX, 0.75,(0, 0, 255),2)
 
         # Display tracker type on frame
-        final = cv2.putText(frame, tracker_type + " Tracker", (100,20), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (50,170,50),2);
+        cv2.putText(frame, tracker_type + " Tracker", (100,20), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (50,170,50),2)
 
         # Display FPS on frame
-        final = cv2.putText(frame, "FPS : " + str(int(fps)), (100,50), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (50,170,50), 2);
+        fps = 1000.0/timing if timing > 0 else 0
+        cv2.putText(frame, "FPS : " + str(int(fps)), (100,50), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (50,170,50), 2)
 
-        return final
+        return frame
+
+    ##
+    # @brief tracks object in frame bounded by bounding box and draws the result, trackStep followed by drawTracking
+    # @param frame current frame with object being tracked
+    # @param tracker_type type of tracker as defined by the user
+    # @param bbox initial bbox passed in by trackerInit: [upper corner, lower corner, width, height]
+    # @param tracker object initialized in trackerInit
+    # @param ok confirmation that tracker is initialized
+    # @return final final image with bounding box around object
+    def track(self, frame, tracker_type, bbox, tracker, ok):
+        ok, bbox, confidence, timing = self.trackStep(frame, tracker)
+        return self.drawTracking(frame, tracker_type, ok, bbox, timing)
 
 
     ##
@@ -99,49 +135,43 @@ class VisionTools:
     # @param obj_cent center of the object passed in by detectObject function
     # @param frame_env original frame captured by the camera. used to calc percent area covered by bbox
     # @param userColor color of desired object as defined by the user
-    # @return p1 one of the two points that define bbox
-    # @return p2 one of the two points that define bbox
-    # @return bbox array defining bounding box: [upper corner, lower corner, width, height]
+    # @param final_obj size of the object passed in by detectObject function. None keeps the old fixed 200x200 box
+    # @param motion (dx, dy) estimated movement of the object until the next re-detection, widens big_ROI
+    # @param adaptive make mask_big_ROI with the adaptive color model instead of the fixed color range
+    # @param max_val -vector- maximum correlation values for each mask slice from detectObject, the bbox is the size of the best one
+    # @param locx -vector- X values of the location of each mask slice from detectObject. With locy and max_val, the bbox
+    #        and big_ROI are centered on the best slice, the one the size is taken from, instead of on obj_cent
+    # @param locy -vector- Y values of the location of each mask slice from detectObject
+    # @return p1 upper left corner of bbox
+    # @return p2 lower right corner of bbox
+    # @return bbox array defining bounding box: [upper left x, upper left y, width, height], clamped to the frame
     # @return percent_area percentage of the frame covered by bounding box (pass to controls)
-    # @return big_ROI region of interest containing object. Pass this into detectObject function for quick detection of object that has already been found
+    # @return big_ROI region of interest containing object (a view of frame_env). Pass this into detectObject function for quick detection of object that has already been found
     # @return mask_big_ROI color mask of big_ROI
-    def BBoxAndROIS(self, obj_cent, frame_env, userColor):
+    def BBoxAndROIS(self, obj_cent, frame_env, userColor, final_obj=None, motion=(0, 0), adaptive=False, max_val=None,
+                    locx=None, locy=None):
+        obj_size = None if final_obj is None else self.objectSize(final_obj, max_val)
+        if obj_size is not None and locx is not None and locy is not None:
+            best = self.bestSlice(final_obj, max_val)
+            if best is not None:
+                obj_cent = (locx[best], locy[best])
         #create region of interest (ROI) around the object that will be used to determine how far the object
         #has moved between frames
-        size_big_ROI = 150
-        y1 = obj_cent[1]-size_big_ROI
-        y2 = obj_cent[1]+size_big_ROI
-        x1 = obj_cent[0]-size_big_ROI
-        x2 = obj_cent[0]+size_big_ROI
-        if y1 < 0:
-            y1 = 0
-        if y2 < 0:
-            y2 = 0
-        if x1 < 0:
-            x1 = 0
-        if x2 < 0:
-            x2 = 0
-        big_ROI = frame_env[y1:y2,x1:x2]
+        x1, y1, w1, h1 = self.searchWindow(obj_cent, obj_size, frame_env.shape, motion)
+        big_ROI = frame_env[y1:y1+h1, x1:x1+w1]
         #gray_big_ROI = cv2.cvtColor(big_ROI, cv2.COLOR_RGB2GRAY)
         blur = cv2.GaussianBlur(big_ROI,(5,5),0)
-        mask_big_ROI = self.findObjWColor(blur, userColor)
-        #FIXME currently uses fixed bounding box size. Need to create bounding boxes around object and a ROI to match size.
-        #This ROI will be used to get the color of the object each time detectObject is called
-        size_bbox = 100
-        p1 = (obj_cent[0] - size_bbox, obj_cent[1] + size_bbox)
-        p2 = (obj_cent[0] + size_bbox, obj_cent[1] - size_bbox)
-        delta_x = (obj_cent[0] + size_bbox) - (obj_cent[0] - size_bbox)
-        delta_y = abs((obj_cent[1] - size_bbox) - (obj_cent[1] + size_bbox))
+        mask_big_ROI = self.findObjWColor(blur, userColor, adaptive)
+        #bounding box the size of the mask slice that matched the object
+        if obj_size is None:
+            obj_size = (200, 200)
+        bbox = self.clampRect((obj_cent[0] - obj_size[0]//2, obj_cent[1] - obj_size[1]//2, obj_size[0], obj_size[1]),
+                              frame_env.shape)
+        p1 = (bbox[0], bbox[1])
+        p2 = (bbox[0] + bbox[2], bbox[1] + bbox[3])
         #calculate percentage of environment covered by bounding box
-        env_height = len(frame_env)
-        env_width = len(frame_env[0])
-        #print(env_height)
-        #print(env_width)
-        env_area = env_height*env_width
-        bbox_area = abs(delta_x*delta_y)
-        percent_area = (bbox_area / env_area)*100
-        #define bbox parameter to be fed into tracker initialization
-        bbox = (p1[0], p1[1], delta_x, delta_y)
+        env_area = frame_env.shape[0]*frame_env.shape[1]
+        percent_area = (bbox[2]*bbox[3] / env_area)*100
 
         return p1, p2, bbox, percent_area, big_ROI, mask_big_ROI
 
@@ -149,32 +179,13 @@ class VisionTools:
     ##
     # @brief checks to see if avg color (RGB) falls within a certain RGB range defining a certain color
     # @param RGB average color of the small_ROI found in detectObject
+    # @param userColor The color the object should have
+    # @param adaptive Check against the adaptive color model instead of the fixed range
     # @return check_color initialized to False, changed to true if RGB falls in a color range
-    def checkColor(self, RGB, check_color = False):
-        check_color_1 = False
-        check_color_2 = False
-        check_color_3 = False
-        #define colors and ranges specific color falls under
-        orange_upper_range = np.array([125, 181, 255], dtype=np.uint8)
-        orange_lower_range = np.array([50, 70, 137], dtype=np.uint8)
-
-        #TODO more color thresholds can be defined for finding other colors. add these as needed. examples below..
-        #green_lower_range = np.array([13, 155, 13], dtype=np.uint8)
-        #green_upper_range = np.array([111, 232, 111], dtype=np.uint8)
-
-        #blue_lower_range = np.array([127, 17, 17], dtype=np.uint8)
-        #blue_upper_range = np.array([224, 116, 116], dtype=np.uint8)
-
-        if (orange_lower_range[0] <= RGB[0] <= orange_upper_range[0] and orange_lower_range[1] <= RGB[1] <= orange_upper_range[1]
-                and orange_lower_range[2] <= RGB[2] <= orange_upper_range[2]):
-            check_color_1 = True
-        #if (orange_lower_range[0] <= RGB[0] <= orange_upper_range[0] and orange_lower_range[1] <= RGB[1] <= orange_upper_range[1]
-                #and orange_lower_range[2] <= RGB[2] <= orange_upper_range[2]):
-            #check_color_2 = True
-        #if (orange_lower_range[0] <= RGB[0] <= orange_upper_range[0] and orange_lower_range[1] <= RGB[1] <= orange_upper_range[1]
-                #and orange_lower_range[2] <= RGB[2] <= orange_upper_range[2]):
-            #check_color_3 = True
-        if check_color_1 == True: #or check_color_2 == True or check_color_3 == True:
+    def checkColor(self, RGB, check_color = False, userColor = "orange", adaptive = False):
+        if adaptive:
+            check_color = self.colorModel.contains(RGB, userColor)
+        elif self.colorSegmenter.contains(RGB, userColor):
             check_color = True
 
         return check_color
@@ -182,27 +193,22 @@ class VisionTools:
 
     ##
     # @brief finds new object location given its location in a previous frame
-    # @center_point center of object found by detectObject
+    # @center_point center of object found by detectObject, or its position predicted by a ConstantVelocityKalman
     # @param gray_frame_env Image passed in from camera
     # @param userMask The shape the user/controls wishes to find
-    # @return new_cent (X,Y) location of center of object
-    # @return loc_diff amount center has moved in X and Y direction
-    def updateLocation(self, center_point, gray_frame_env, userMask):
-        #FIXME this function does not work yet. further development is needed
-        #returns the (x,y) coords of the centers of the max corrs with an (x,y) size of object
-        x_pos = locx[int((length+1)/2)-1]
-        y_pos = locy[int((length+1)/2)-1]
-        new_cent = [x_pos, y_pos]
-        if x_pos >= center_point[0]:
-            x_diff = x_pos-center_point[0]
-        else:
-            x_diff = -1*(center_point[0]-x_pos)
-        if y_pos >= center_point[1]:
-            y_diff = y_pos-center_point[1]
-        else:
-            y_diff = -1*(center_point[0]-y_pos)
-
-        loc_diff = [x_diff, y_diff]
+    # @param threshold detection tolerance (ex. threshold = 0.95 --> 95 percent match)
+    # @param obj_size (w, h) size of the object, None for the old fixed 300x300 window
+    # @param spread (dx, dy) how far the object may be from center_point, e.g. ConstantVelocityKalman.searchRadius
+    # @return new_cent (X,Y) location of center of object, None if it was not found around center_point
+    # @return loc_diff amount center has moved in X and Y direction, None if it was not found
+    def updateLocation(self, center_point, gray_frame_env, userMask, threshold=0.4, obj_size=None, spread=(0, 0)):
+        #only the window the object can have moved to is searched
+        window = self.searchWindow(center_point, obj_size, gray_frame_env.shape, spread, margin=0 if obj_size else 0.5)
+        new_cent, locx, locy, max_val, final_obj, small_ROI, detect = self.detectObjectInWindows(gray_frame_env, gray_frame_env, userMask,
+                                                                                                 threshold, windows=[window])
+        if not detect:
+            return None, None
+        loc_diff = [new_cent[0] - center_point[0], new_cent[1] - center_point[1]]
 
         return new_cent, loc_diff
 
@@ -214,6 +220,9 @@ class VisionTools:
     # @param detection tolerance (ex. threshold = 0.95 --> 95 percent match)
     # @param div number of slices in the size of the mask
     # @param size_range maximum scaling of the mask based on the original size
+    # @param pyramid_levels if > 0, search a frame downsampled this many times and only refine small windows at full resolution
+    # @param use_fft if True, the full frame correlation of every slice is done in one batched FFT instead of one matchTemplate per slice.
+    #        On flat regions of the color mask the slices can peak at other, equally good locations, so obj_cent can differ
     # @return obj_cent center point of detected object
     # @return locx -vector- X values of the location (center)
     # @return locy -vector- Y values of the location (center)
@@ -221,144 +230,154 @@ class VisionTools:
     # @return max_val -vector- maximum correlation values for each mask
     # @return small_ROI small region of interest around object, will be used to find/define average color
     # @return detect initialized to False, changed to True if object is detected
-    def detectObject(self, frame_env, gray_frame_env, userMask, threshold, div=20, size_range=200, detect = False):
-        match_type = cv2.TM_CCORR_NORMED
-        if userMask == "circle":
-            #define relative path of test files
-            path = os.getcwd()
-            #in case of windows users, switched backslashes with fwd slashes
-            pathFwd = '/'.join(path.split('\\'))
-            pathFwd = pathFwd + '/test_files/'
-            filename = 'circ_obj.PNG'
-            fullFilePath = pathFwd + filename
-            obj = cv2.imread(fullFilePath, cv2.IMREAD_GRAYSCALE)
-        #TODO add functionality for other shape masks. examples below..
-        #if userMask == "square":
-            #obj = cv2.imread('/home/oren/vision/tests/test_files/sq_obj.PNG'), cv2.IMREAD_GRAYSCALE)
-        #if userMask == "triangle":
-            #obj = cv2.imread('/home/oren/vision/tests/test_files/tri_obj.PNG'), cv2.IMREAD_GRAYSCALE)
-        #imk stores the sliced stages of the mask
-        imk = []
-
-
-        for J in range(1, div):
-            imk.append(cv2.resize(obj, (0,0), fx=J*div/size_range, fy=J*div/size_range))
-            #slices mask from div/size_range (minimum size) and div*div/size_range (maximum size)
-        #variables, based on size of imk after loop
-        length = len(imk)
-        b = [0]*length
-        c =[0]*length
-        y1 = [0]*length
-        y2 = [0]*length
-        x1 = [0]*length
-        x2 = [0]*length
-        mn=[0]*length
-        new_gray_frame_env = [0]*length
-        corrnew = [0]*length
-        envir = [0]*length
-        max_loc = [0]*length
-        max_loc_new=[0]*length
-        max_val = [0]*length
-        max_val_new = [0]*length
-        intem_y2 = [0]*length
-        intem_x1 = [0]*length
-        final_obj = [0]*length
-        intem_loc = [0]*length
-        locx = [0]*length
-        locy = [0]*length
-        k = np.ones(len(imk)+1, dtype = np.int)
-        lb = gray_frame_env.shape
-
-        for index, item in enumerate(imk):
-           #select slice of object and compute properties
-           b[index] = imk[index]
-           w, h = b[index].shape[::-1]
-           h1 = math.ceil(h/2)
-           w1 = math.ceil(w/2)
-           #append a border of zero around environment to prep for computing corr (half of mask size in corresponding direction)
-           envir[index] = cv2.copyMakeBorder(gray_frame_env,h1,h1,w1,w1,cv2.BORDER_CONSTANT,0)
-           c[index] = cv2.matchTemplate(envir[index], b[index], match_type)
-           #IMportant: max_loc is in the form of (x,y) tuple, i.e. col then row
-           min_val, max_val[index], min_loc, max_loc[index] = cv2.minMaxLoc(c[index])
-           #save size of obj in (x,y) form, save intermediate locations (need this to save changes made by dyn env later)
-           final_obj[index] = b[index].shape[::-1]
-           intem_loc[index] = max_loc[index]
-           intem_x1[index] = x1[index]
-           intem_y2[index] = y2[index]
-           #resize mask slice by .2% of original mask size
-           b[index] = cv2.resize(obj, (0,0), fx=(k[index]*.002+(index+1)*div/size_range), fy=(k[index]*.002+(index+1)*div/size_range))
-           mn[index] = b[index].shape
-           #MN is a tuple for the size of the matrix as MxN
-           h1 = math.ceil(mn[index][0]/2)
-           w1 = math.ceil(mn[index][1]/2)
-           y1[index] = max_loc[index][1] + mn[index][0]
-           y2[index] = max_loc[index][1] - mn[index][0]
-           x1[index] = max_loc[index][0] - mn[index][1]
-           x2[index] = max_loc[index][0] + mn[index][1]
-           #checking to see if the dyn env caused impossible pixels to be selected (negative or beyond max dim)
-           if (y2[index] < 0):
-               y2[index] = 0
-           if (x1[index] < 0):
-               x1[index] = 0
-           if (x2[index] > lb[1]):
-                   x2[index] = lb[1]
-           if (y1[index] > lb[0]):
-                   y1[index] = lb[0]
-           #select the section from the whole env
-           new_gray_frame_env[index] = gray_frame_env[y2[index]:y1[index], x1[index]:x2[index]]
-           envir[index] = cv2.copyMakeBorder(new_gray_frame_env[index],h1,h1,w1,w1,cv2.BORDER_CONSTANT,0)
-           corrnew[index] = cv2.matchTemplate(envir[index], b[index], match_type)
-           min_val_new, max_val_new[index], min_loc_new, max_loc_new[index] = cv2.minMaxLoc(corrnew[index])
-           #While loop: trailing stop of 10% (i.e. if current cor falls below 90% of max, exit loop)
-           #k[index] < 10 establishes a min for iterations, as a trend might not appear until a certain increase
-           #max_val > .25 dictates that if the max corr is still below 1/4 by the tenth iteration to exit loop
-           while ((max_val_new[index] > (0.9*max_val[index]) or (k[index] < 10)) and (k[index] < 10 or max_val[index] > 0.25)):
-                #if statement to check when one mask slice reaches the very start of the next slice
-                if (k[index] > (div/size_range)/.002):
-                    break
-                if (max_val_new[index] > max_val[index]):
-                    final_obj[index] = b[index]
-                    max_val[index] = max_val_new[index]
-                    intem_loc[index] = max_loc_new[index]
-                    intem_x1[index] = x1[index]
-                    intem_y2[index] = y2[index]
-                    k[index] = k[index] + 1
-                if (max_val_new[index] > threshold):
-                    detect = True
-                if (max_val_new[index] < threshold):
-                    b[index] = cv2.resize(obj, (0,0), fx=(k[index]*.002+(index+1)*div/size_range), fy=(k[index]*.002+(index+1)*div/size_range))
-                    mn[index] = b[index].shape
-   #mn is a tuple for the size of the matrix as MxN
-                    h1 = math.ceil(mn[index][0]/2)
-                    w1 = math.ceil(mn[index][1]/2)
-                    y1[index] = max_loc[index][1] + mn[index][0]
-                    y2[index] = max_loc[index][1] - mn[index][0]
-                    x1[index] = max_loc[index][0] - mn[index][1]
-                    x2[index] = max_loc[index][0] + mn[index][1]
-                    if (y2[index] < 0):
-                        y2[index] = 0
-                    if (x1[index] < 0):
-                        x1[index] = 0
-                    if (x2[index] > lb[1]):
-                        x2[index] = lb[1]
-                    if (y1[index] > lb[0]):
-                        y1[index] = lb[0]
-   #new_img = img[y2:y1, 0:x2]
-                    new_gray_frame_env[index] = gray_frame_env[y2[index]:y1[index], x1[index]:x2[index]]
-                    envir[index] = cv2.copyMakeBorder(new_gray_frame_env[index],h1,h1,w1,w1,cv2.BORDER_CONSTANT,0)
-
-                    corrnew[index] = cv2.matchTemplate(envir[index], b[index], match_type)
-                    min_val_new, max_val_new[index], min_loc_new, max_loc_new[index] = cv2.minMaxLoc(corrnew[index])
-
-                    if (max_val_new[index] > max_val[index]):
-                        final_obj[index] = b[index].shape[::-1]
-                        intem_loc[index] = max_loc_new[index]
-                        intem_x1[index] = x1[index]
-                        intem_y2[index] = y2[index]
-                break
-           #locx,locy save the adjusted values of the location relative to the original environment
-           locx[index] = intem_loc[index][0] + intem_x1[index]
-           locy[index] = intem_loc[index][1] + intem_y2[index]
+    def detectObject(self, frame_env, gray_frame_env, userMask, threshold, div=20, size_range=200, detect = False, pyramid_levels=0, use_fft=False):
+        if pyramid_levels > 0:
+            locx, locy, max_val, final_obj, found = self.pyramidSearch.search(gray_frame_env, userMask, threshold,
+                                                                              div, size_range, pyramid_levels)
+            obj_cent, small_ROI = self.centerAndSmallROI(frame_env, locx, locy)
+            return obj_cent, locx, locy, max_val, final_obj, small_ROI, detect or found
+
+        #the detector (and all of its buffers) is made once per shape and frame resolution
+        detector = self.getDetector(userMask, gray_frame_env.shape, div, size_range)
+        results, found = detector.detect(gray_frame_env, threshold, use_fft)
+        detect = detect or found
+        locx = results['loc_x'].tolist()
+        locy = results['loc_y'].tolist()
+        max_val = results['max_val'].tolist()
+        final_obj = list(zip(results['obj_w'].tolist(), results['obj_h'].tolist()))
+        obj_cent, small_ROI = self.centerAndSmallROI(frame_env, locx, locy)
+        #FIXME fix detect to give output based on whether or not shape was actually found
+
+        return obj_cent, locx, locy, max_val, final_obj, small_ROI, detect
+
+    ##
+    # @brief finds object location like detectObject, but only correlates inside search windows and outside exclusion rectangles
+    # @param frame_env image taken in from camera
+    # @param gray_frame_env grayscaled version of frame_env
+    # @param userMask The shape the user/controls wishes to find
+    # @param threshold detection tolerance (ex. threshold = 0.95 --> 95 percent match)
+    # @param windows list of (x, y, w, h) search windows in frame coordinates, None searches the whole frame, an empty list finds nothing (detect is False)
+    # @param exclusions list of (x, y, w, h) rectangles in frame coordinates that are never matched (e.g. an object already being tracked)
+    # @param div number of slices in the size of the mask
+    # @param size_range maximum scaling of the mask based on the original size
+    # @return same outputs as detectObject, in full frame coordinates, for the window with the best match
+    def detectObjectInWindows(self, frame_env, gray_frame_env, userMask, threshold, windows=None, exclusions=(),
+                              div=20, size_range=200, detect = False):
+        H, W = gray_frame_env.shape[:2]
+        if windows is None:
+            windows = [(0, 0, W, H)]
+        detector = self.getDetector(userMask, gray_frame_env.shape, div, size_range)
+        if len(windows) == 0:
+            #nothing to search (e.g. every window was clamped away): the same empty result as a window that matched nothing
+            results = np.zeros((1, detector.length), dtype=detector.resultType)
+            found = np.zeros(1, dtype=bool)
+        else:
+            results, found = detector.detectWindows(gray_frame_env, threshold, windows, exclusions)
+        #keep the window whose best slice correlated the most
+        best = int(np.argmax(results['max_val'].max(axis=1)))
+        detect = detect or bool(found[best])
+        locx = results[best]['loc_x'].tolist()
+        locy = results[best]['loc_y'].tolist()
+        max_val = results[best]['max_val'].tolist()
+        final_obj = list(zip(results[best]['obj_w'].tolist(), results[best]['obj_h'].tolist()))
+        obj_cent, small_ROI = self.centerAndSmallROI(frame_env, locx, locy)
+
+        return obj_cent, locx, locy, max_val, final_obj, small_ROI, detect
+
+    ##
+    # @brief finds every object of a shape in one pass (e.g. all the buoys), instead of the single best match of detectObject
+    # @param gray_frame_env grayscaled (or color masked) frame
+    # @param userMask The shape the user/controls wishes to find
+    # @param threshold detection tolerance (ex. threshold = 0.95 --> 95 percent match)
+    # @param overlapThresh largest intersection over union two reported objects of the same size may have, see crossScaleSuppression
+    # @param div number of slices in the size of the mask
+    # @param size_range maximum scaling of the mask based on the original size
+    # @param exclusions list of (x, y, w, h) rectangles in frame coordinates that are never matched
+    # @return detections (N, 4) array of (x, y, scale, score) rows, best score first
+    def detectObjects(self, gray_frame_env, userMask, threshold, overlapThresh=0.3, div=20, size_range=200, exclusions=()):
+        detector = self.getDetector(userMask, gray_frame_env.shape, div, size_range)
+        return detector.detectAll(gray_frame_env, threshold, overlapThresh, exclusions=exclusions)
+
+    ##
+    # @brief returns the reusable detector for a shape and frame resolution, making it the first time
+    # @param userMask The shape the user/controls wishes to find
+    # @param frame_shape shape of the single channel frames that will be searched
+    # @param div number of slices in the size of the mask
+    # @param size_range maximum scaling of the mask based on the original size
+    # @return detector ObjectDetector with buffers preallocated for frame_shape
+    def getDetector(self, userMask, frame_shape, div=20, size_range=200):
+        key = (userMask, frame_shape[0], frame_shape[1], div, size_range)
+        detector = self.detectors.get(key)
+        if detector is None:
+            detector = ObjectDetector(self.templateBank, userMask, frame_shape, div, size_range, self.fftCorrelator)
+            self.detectors[key] = detector
+        return detector
+
+    ##
+    # @brief picks the size of the object out of the per-slice sizes found by detectObject
+    # @param final_obj -vector- (w, h) size of the best mask of each slice, or a single (w, h)
+    # @param max_val -vector- maximum correlation values for each slice, the size of the best matching slice is picked.
+    #        None picks the median slice, the slice obj_cent is taken from
+    # @return obj_size (w, h) of the picked mask slice, the matched template scale. None if that slice matched nothing
+    def objectSize(self, final_obj, max_val=None):
+        if len(final_obj) == 2 and np.isscalar(final_obj[0]):
+            return int(final_obj[0]), int(final_obj[1])
+        best = self.bestSlice(final_obj, max_val)
+        size = final_obj[int((len(final_obj)+1)/2)-1 if best is None else best]
+        if not size or size[0] <= 0 or size[1] <= 0:
+            return None
+        return int(size[0]), int(size[1])
+
+    ##
+    # @param final_obj -vector- (w, h) size of the best mask of each slice
+    # @param max_val -vector- maximum correlation values for each slice
+    # @return best index of the best matching slice, None if there are no per-slice values to pick from
+    def bestSlice(self, final_obj, max_val):
+        if max_val is None or len(max_val) != len(final_obj):
+            return None
+        return int(np.argmax(max_val))
+
+    ##
+    # @brief clamps a rectangle to the frame
+    # @param rect (x, y, w, h) rectangle, may reach outside the frame
+    # @param frame_shape shape of the frame
+    # @return rect (x, y, w, h) part of the rectangle inside the frame, w or h is 0 if none of it is
+    def clampRect(self, rect, frame_shape):
+        x, y, w, h = [int(round(v)) for v in rect]
+        H, W = frame_shape[:2]
+        x1 = min(max(x, 0), W)
+        y1 = min(max(y, 0), H)
+        x2 = min(max(x + w, 0), W)
+        y2 = min(max(y + h, 0), H)
+        return x1, y1, x2 - x1, y2 - y1
+
+    ##
+    # @brief window to re-detect an object in, sized from the object and how far it can move before the next re-detection
+    # @param obj_cent center of the object
+    # @param obj_size (w, h) size of the object, None for the old fixed 300x300 window
+    # @param frame_shape shape of the frame, the window is clamped to it
+    # @param motion (dx, dy) estimated movement of the object until the next re-detection
+    # @param margin room left around the object on each side, as a fraction of its size
+    # @return window (x, y, w, h) in frame coordinates
+    def searchWindow(self, obj_cent, obj_size, frame_shape, motion=(0, 0), margin=0.5):
+        if obj_size is None:
+            half_w = half_h = 150
+        else:
+            half_w = obj_size[0]*(0.5 + margin)
+            half_h = obj_size[1]*(0.5 + margin)
+        half_w += abs(motion[0])
+        half_h += abs(motion[1])
+        return self.clampRect((obj_cent[0] - half_w, obj_cent[1] - half_h, 2*half_w, 2*half_h), frame_shape)
+
+    ##
+    # @brief picks the object center out of the per-slice locations found by detectObject
+    # @param frame_env image taken in from camera
+    # @param locx -vector- X values of the location (center) for each mask slice
+    # @param locy -vector- Y values of the location (center) for each mask slice
+    # @return obj_cent center point of detected object (location of the median mask slice)
+    # @return small_ROI small region of interest around object, will be used to find/define average color
+    def centerAndSmallROI(self, frame_env, locx, locy):
+        length = len(locx)
         #returns the (x,y) coords of the centers of the max corrs with an (x,y) size of object
         obj_cent = [locx[int((length+1)/2)-1], locy[int((length+1)/2)-1]]
         #create small region of interest for getting the average color of the object
@@ -376,43 +395,56 @@ class VisionTools:
         if x4 < 0:
             x4 = 0
         small_ROI = frame_env[y3:y4,x3:x4]
-        #FIXME fix detect to give output based on whether or not shape was actually found
 
-        return obj_cent, locx, locy, max_val, final_obj, small_ROI, detect
+        return obj_cent, small_ROI
 
 
     ##
     # @brief finds an object based on a desired color: Developed by Oren Pierce
     # @param frame The frame in which the object needs to be found
     # @param color The color of the desired object
+    # @param adaptive Use the adaptive color model instead of the fixed range
+    # @param foreground Optional foreground mask of the frame from updateForeground, background pixels are left out
     # @return output returns a color mask (color is white, everything else is black)
-    def findObjWColor(self, frame, userColor):
-        #define colors and ranges specific color falls under
-        #note: will have to adjust thresholds for specific cases. Color code is [B, G, R]
-        orange_upper_range = np.array([125, 181, 255], dtype=np.uint8)
-        orange_lower_range = np.array([50, 70, 137], dtype=np.uint8)
-
-        red_lower_range = np.array([13, 13, 168], dtype=np.uint8)
-        red_upper_range = np.array([101, 101, 242], dtype=np.uint8)
-
-        blue_lower_range = np.array([127, 17, 17], dtype=np.uint8)
-        blue_upper_range = np.array([224, 116, 116], dtype=np.uint8)
+    def findObjWColor(self, frame, userColor, adaptive=False, foreground=None):
+        if adaptive:
+            mask = self.colorModel.mask(frame, userColor)
+        else:
+            #color ranges are compiled once by the color segmenter. Color code is [B, G, R]
+            mask = self.colorSegmenter.mask(frame, userColor)
+        if foreground is not None:
+            cv2.bitwise_and(mask, foreground, dst=mask)
 
-        green_lower_range = np.array([13, 155, 13], dtype=np.uint8)
-        green_upper_range = np.array([111, 232, 111], dtype=np.uint8)
+        return(mask)
 
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    ##
+    # @brief finds what is not background in a frame, and learns the background from the rest. Call once per frame
+    #        and pass the mask on to BuoyBoxes, findObjWColor (and so to the detector)
+    # @param frame The next frame from the camera
+    # @return foreground mask (foreground is white, background is black). It is overwritten by the next call
+    def updateForeground(self, frame):
+        return self.backgroundModel.apply(frame)
 
-        if userColor == "red":
-            mask = cv2.inRange(frame, red_lower_range, red_upper_range)
-        elif userColor == "orange":
-            mask = cv2.inRange(frame, orange_lower_range, orange_upper_range)
-        elif userColor == "blue":
-            mask = cv2.inRange(frame, blue_lower_range, blue_upper_range)
-        elif userColor == "green":
-            mask = cv2.inRange(frame, green_lower_range, green_upper_range)
+    ##
+    # @brief teaches the adaptive color model the color of a confirmed detection
+    # @param userColor The color the object was confirmed as
+    # @param ROI Region of the frame covered by the object (e.g. the small_ROI of detectObject)
+    # @param mask Mask of the object pixels of the ROI, only the pixels where it is non zero are learned. If None, the
+    #        pixels of the ROI that fit the fixed color range or the current model are used, never the whole ROI
+    # @return True if the model learned from the ROI
+    def updateColorModel(self, userColor, ROI, mask=None):
+        if mask is None:
+            mask = self.colorSegmenter.mask(ROI, userColor)
+            cv2.bitwise_or(mask, self.colorModel.mask(ROI, userColor), dst=mask)
+        return self.colorModel.update(userColor, ROI, mask)
 
-        return(mask)
+    ##
+    # @brief finds objects of several colors at once, with a single segmentation pass over the frame
+    # @param frame The frame in which the objects need to be found
+    # @param colors Names of the colors to find, defaults to every color of the segmenter
+    # @return masks {color: color mask (color is white, everything else is black)}
+    def findObjsWColor(self, frame, colors=None):
+        return self.colorSegmenter.masks(frame, colors)
 
 
     ##
@@ -421,23 +453,35 @@ class VisionTools:
     # @return output returns average values and image of that color
 
     def avgColor(self, frame):
-        #take average color value of each row of pixels
-        average_color_per_row = np.average(frame, axis=0)
-
-        #take the average of that average
-        average_color = np.average(average_color_per_row, axis=0)
-
-        #convert the array into uint8 format (for values from 0 to 255)
-        average_color = np.uint8(average_color)
+        average_color = self.avgColorValue(frame)
 
         #make a x by y pixel image of the average color
-        avg_color_image = np.array([[average_color]*500]*500, np.uint8)
+        avg_color_image = np.full((500, 500) + frame.shape[2:], average_color, np.uint8)
 
         #write the image file for the average color image
         #cv2.imwrite("avg_color.png", avg_color_image)
 
         return(avg_color_image)
 
+    ##
+    # @brief finds average b, g, r value of an image without building the average color image
+    # @param frame The frame in which average color is to be found
+    # @return average_color uint8 array with the average value of each channel, same as avgColor(frame)[0, 0]
+    def avgColorValue(self, frame):
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        #convert into uint8 format (for values from 0 to 255)
+        return np.uint8(cv2.mean(frame)[:channels])
+
+    ##
+    # @brief average colors of many regions of the same frame, each in constant time
+    # @param frame The frame the regions belong to, None to reuse the frame of the previous call
+    # @param rects (N, 4) regions as (x, y, w, h), clipped to the frame
+    # @return colors (N, channels) float array with the average color of each region
+    def regionColors(self, frame, rects):
+        if frame is not None:
+            self.integralImage.setFrame(frame)
+        return self.integralImage.means(rects)
+
     ##
     # @brief scans a region of interest (roi) accross an image: Developed by Oren Pierce
     # @param frame The frame the roi is going to scan
@@ -505,21 +549,14 @@ class VisionTools:
     # @param minc The minimum color limit in gray/color
     # @param newcolor The new color to draw the midline in gray/color
     # @return output Returns image with a midline
+    # @return points (M, 2) array of (x, y) midline points: the middle column of the line in every row it covers,
+    #         or the middle row in every column when the line is wider than tall
+    # @return line (angle, offset) of the straight line through the midline, see line_geometry.fitLine. None if there is no line
     def midline(self,image, coordList, minc, newcolor):
-        #Sort by y coords
-        coordList = coordList[np.argsort(coordList[:,1])]
-
-        #Gives every unique y coordinate
-        yCoords = np.unique(coordList[:,1])
-
-        for coord in yCoords:
-            coords = [elem[0] for elem in coordList if elem[1] == coord]
-            min = np.amin(coords)
-            max = np.amax(coords)
-            mid = ((max+min))/2
-            image[mid][coord] = newcolor
+        points = midlinePoints(coordList)
+        image[points[:, 1], points[:, 0]] = newcolor
         output=image
-        return output
+        return output, points, fitLine(points, image.shape)
 
     ##
     # @brief Filters image by shade of gray
@@ -575,52 +612,29 @@ class VisionTools:
     # @param frame The frame to be filtered
     # @return output Filtered frame of largest contour
     def lineDet(self, frame):
-        frame = cv2.medianBlur(frame, 5)
-
-        # Threshold filter to find contours
-        ret, thresh = cv2.threshold(frame, 153, 255, 0)
-        bw = cv2.cvtColor(thresh, cv2.COLOR_BGR2GRAY)
-        # Find Contours
-        q, contours, hierarchy = cv2.findContours(bw, cv2.RETR_TREE,
-                                                  cv2.CHAIN_APPROX_SIMPLE)
-
-        # Find the index of the largest contour
-        areas = [cv2.contourArea(c) for c in contours]
-        max_index = np.argmax(areas)
-        cnt = contours[max_index]
-
-        # Create Rectangle around largest contour (ROI)
-        x, y, w, h = cv2.boundingRect(cnt)
-        new = cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-
-        # Compare region of interest to original image,
-        #  set everything outside the ROI to zero
-        mask = np.zeros(new.shape, np.uint8)
-        mask[y:y+h, x:x+w] = new[y:y+h, x:x+w]
-        out = cv2.bitwise_and(new, mask)
-
-        # Filter for Max RGB values
-        b, g, r = cv2.split(out)
-        M = np.maximum(np.maximum(r, g), b)
-        r[r < M] = 0
-        g[g < M] = 0
-        b[b < M] = 0
-
-        # Merge back into a maximum RGB image
-        image2 = cv2.merge([b, g, r])
-
-        # Set upper and lower limits for colors
-        lower = np.array([0, 0, 10])
-        upper = np.array([0, 0, 255])
-
-        # Filter out all colors except the tape
-        mask = cv2.inRange(image2, lower, upper)
+        self.lineDetector.detect(frame)
 
         # Output only tape with black background
-        output = cv2.bitwise_and(image2, image2, mask=mask)
+        output = self.lineDetector.render()
 
         return output
 
+    ##
+    # @brief Orange line detection that returns the line itself instead of a filtered frame
+    # @param frame The frame from the downward camera
+    # @return line (angle, offset) of the line for the controllers, see line_geometry.fitLine. None if there is no line
+    # @return points (M, 2) array of (x, y) midline points of the line
+    # @return rect (x, y, w, h) region of the frame the line was found in, None if there is none
+    def findLine(self, frame):
+        return self.lineDetector.detect(frame)
+
+    ##
+    # @brief Orange line tracking: only the band around the line's predicted position is searched, the whole frame only when it is lost
+    # @param frame The next frame from the downward camera
+    # @return line (angle, offset, confidence) of the line for the controllers, None if it was not found
+    def trackLine(self, frame):
+        return self.lineTracker.update(frame)
+
     ##
     # @brief Orange line position detection, developed by Brett Gonzales
     # @param detected The detected line to find position
@@ -686,13 +700,11 @@ class VisionTools:
     # @brief Finds the corners of a mask
     # @param mask Mask of the image you want to find corners of
     # @pre The mask must be black and white, and only 4 sided polygons will work
-    # @return rect Array containing the four corners
+    # @return rect Array containing the four corners, None if neither of the two largest contours has four corners
     # @return imgCnt The contour of mask used to find the corners
     def getCorners(self, mask):
-        (_, cnts, _) = cv2.findContours(mask.copy(),
-                                        cv2.RETR_TREE,
-                                        cv2.CHAIN_APPROX_SIMPLE)
-        cnts = sorted(cnts, key=cv2.contourArea, reverse=True)[:2]
+        # the two largest contours
+        cnts, rects, areas = largestContours(mask, 2)
         # loop over our contours
         imgCnt = None
         for c in cnts:
@@ -705,6 +717,8 @@ class VisionTools:
             if len(approx) == 4:
                 imgCnt = approx
                 break
+        if imgCnt is None:
+            return None, None
 
         # Find the corners of the contour
         pts = imgCnt.reshape(4, 2)
@@ -757,146 +771,68 @@ class VisionTools:
     ##
     # @brief Draws boxes around found buoys and returns image
     # @param image - The input image with buoys to be drawn over
+    # @param boxes - buoyTracker that numbers the buoys from frame to frame, 0 to leave them unnumbered
+    # @param foreground - foreground mask of image from updateForeground, computed here if None
     # @return image - The final image with boxes drawn over initial image
-    def BuoyBoxes(self, image, boxes=0):
-
-        # Get average background color
-        avg_color_rows = np.average(image, axis=0)
-        avg_color = np.average(avg_color_rows, axis=0)
-        avg_color = np.uint8(avg_color)
-
-        # Create image of average color (no use in final product)
-        avg_color_img = np.array([[avg_color] * 640] * 360, np.uint8)
+    def BuoyBoxes(self, image, boxes=0, foreground=None):
 
-        upper_filter = np.array([avg_color[0] + 50, avg_color[1] + 50, avg_color[2] + 50])
-        lower_filter = np.array([avg_color[0] - 50, avg_color[1] - 50, avg_color[2] - 50])
+        # Everything that is not background (see updateForeground)
+        if foreground is None:
+            foreground = self.updateForeground(image)
 
-        mask = cv2.inRange(image, lower_filter, upper_filter)
-        invert = cv2.bitwise_not(mask)
-        res = cv2.bitwise_and(image, image, mask=invert)
+        # Filter to find contours
+        bw = cv2.medianBlur(foreground, 5)
 
-        frame = cv2.medianBlur(res, 5)
+        # Find the 3 largest contours
+        cnt, rects, areas = largestContours(bw, 3)
+        if len(rects) == 0:
+            return image
 
-        # Threshold filter to find contours
-        bw = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # Colors of the contour centers are read from the frame before any box is drawn on it
+        self.integralImage.setFrame(image)
 
-        # Find Contours
-        q, contours, hierarchy = cv2.findContours(bw, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        # Average color of the 11x11 patch in the middle of each contour
+        mids = rects[:, :2] + 0.5*rects[:, 2:]
+        colors = self.integralImage.means(np.column_stack((np.floor(mids) - 5, np.full((len(rects), 2), 11))))
 
-        # Find the index of the 3 largest contours
-        areas = [cv2.contourArea(c) for c in contours]
-        i = 0
-        cnt = [0, 0, 0]
-        max_index = [0, 0, 0]
-        while i < 3:
-            if i == 2:
-                areas[max_index[0]] = 0
-                areas[max_index[1]] = 0
-            elif i == 1:
-                areas[max_index[0]] = 0
-            max_index[i] = np.argmax(areas)
-            cnt[i] = contours[max_index[i]]
+        # Buoy numbers, kept from frame to frame when a buoyTracker is passed in
+        matches = boxes.checkAll(mids, colors) if isinstance(boxes, buoyTracker) else None
 
         # Create Rectangle around 3 largest contours (ROI) using average color of middle of contour
-            x, y, w, h = cv2.boundingRect(cnt[i])
-            k = -5
-            redVal = 0
-            grnVal = 0
-            bluVal = 0
-            while k <=5:
-                j = -5
-                while j <=5:
-                    px = image[math.floor(y+0.5*h)+k, math.floor(x+0.5*w)+j]
-                    redVal += int(px[0])
-                    grnVal += int(px[1])
-                    bluVal += int(px[2])
-                    j += 1
-                k += 1
-            redVal /= 121
-            grnVal /= 121
-            bluVal /= 121
-            image = cv2.rectangle(image, (x, y), (x + w, y + h), (redVal, grnVal, bluVal), 2)
-            midx = x + 0.5*w
-            midy = y + 0.5*h
+        for j, (x, y, w, h) in enumerate(rects.tolist()):
+            image = cv2.rectangle(image, (x, y), (x + w, y + h), tuple(colors[j].tolist()), 2)
             buoyString = 'buoy #'
-            #buoyString = 'buoy #' + str(boxes.check((midx, midy), (redVal, grnVal, bluVal)))
+            if matches is not None:
+                buoyString = 'buoy #' + str(matches[j])
             image = cv2.putText(image, buoyString, (x, y+h),
                                 cv2.FONT_HERSHEY_TRIPLEX, 0.5, (0, 0, 0), 0, cv2.LINE_AA)
-            i += 1
         return image
 
 class buoyTracker:
-    location = []
-    color = []
     ##
-    # @brief Does nothing important for the time being.  Will add some
-    #        functionality later
-    def __init__(self):
-        # Dummy variable, not used for anything
-        self.useme = True
+    # @brief keeps the numbers of the buoys the same from frame to frame
+    # @param max_buoys most buoys remembered at once
+    # @param max_age frames a buoy is remembered without being seen
+    def __init__(self, max_buoys=8, max_age=15):
+        self.tracker = MultiTargetTracker(max_buoys, max_age)
 
     ##
-    # @brief base call function to track buoys
+    # @brief base call function to track buoys, for a frame with a single buoy
     # @param location - midpoint of buoy to track
     # @param color - RGB color of buoy to track
     # @return match - returns the buoy number that has been tracked
     def check(self, location, color):
-        closestLoc = self.checkLoc(location)
-        colorMatch = self.checkColor(color)
-        if len(self.location) < 3 or closestLoc == -1 or colorMatch == -1 or closestLoc != colorMatch:
-            self.addBuoy(location, color)
-            match = len(self.location) - 1
-        else:
-            match = closestLoc
-        self.update(location, color, match)
-        return match
+        return int(self.checkAll([location], [color])[0])
 
     ##
-    # @brief Finds buoy with closest location to last known buoys
-    # @param location - midpoint of buoy to track
-    # @return locMatch - index of buoy that has been tracked
-    def checkLoc(self, location):
-        locMatch = -1
-        closest = -1
-        for c in self.location:
-            x1, y1 = c
-            x2, y2 = location
-            distance = math.hypot(x1 - x2, y1 - y2)
-            if closest == -1:
-                closest = distance
-                locMatch = self.location.index(c)
-            elif closest > distance:
-                closest = distance
-                locMatch = self.location.index(c)
-        return locMatch
-
-    ##
-    # @brief Finds buoy with closest color to last known buoys
-    # @param color - RGB color of buoy to track
-    # @return colorMatch - index of buoy that has been tracked
-    def checkColor(self, color):
-        colorMatch = -1
-        closest = 250
-        for c in self.color:
-            difference = abs(color[0] - c[0]) + abs(color[1] - c[1]) + abs(color[2] - c[2])
-            if difference < closest:
-                closest = difference
-                colorMatch = self.color.index(c)
-        return colorMatch
-
-    ##
-    # @brief Adds a new buoy to class function to be searched
-    # @param location - midpoint of buoy to track
-    # @param color - RGB color of buoy to track
-    def addBuoy(self, location, color):
-        self.location.append(location)
-        self.color.append(color)
+    # @brief tracks all the buoys found in one frame at once
+    # @param locations - midpoints of the buoys found in the frame
+    # @param colors - RGB colors of the buoys found in the frame
+    # @return matches - buoy number of each buoy, -1 if more buoys are in view than can be remembered
+    def checkAll(self, locations, colors):
+        return self.tracker.update(locations, colors)
 
     ##
-    # @brief updates buoy's new location and color
-    # @param location - midpoint of buoy to track
-    # @param color - RGB color of buoy to track
-    # @param index - index of buoy to be updated
-    def update(self, location, color, index):
-        self.location[index] = location
-        self.color[index] = color
+    # @return buoys - list of (number, location, velocity, color, frames unseen, times seen) of the remembered buoys
+    def getBuoys(self):
+        return self.tracker.getTracks()